@@ -0,0 +1,398 @@
+"""Admission control for the upload endpoints of main.py.
+
+Every /chat upload turns into a downstream mastering call, so requests
+are admitted in three steps before the app sees them:
+
+1. per-caller and per-artist token buckets, so one label's burst only
+   spends that label's budget. Callers are keyed by client address; the
+   X-User-Id / X-Artist-Id headers are only used when an authenticating
+   proxy in front of the app sets them (ADMISSION_TRUST_IDENTITY_HEADERS),
+   since clients could otherwise pick a fresh identity per request;
+2. a global in-flight cap shared by all callers;
+3. a maximum upload size, checked against Content-Length and enforced
+   again while the body streams in.
+
+In "queue" mode a request that is rate limited or finds no free slot
+waits up to ADMISSION_QUEUE_TIMEOUT seconds; in "reject" mode it gets
+429/503 with Retry-After straight away. Tokens taken for a request that
+then finds no slot are handed back. Buckets live in process memory by
+default, or in a local SQLite file (ADMISSION_BACKEND=sqlite) so several
+worker processes on one host share them; a bucket idle long enough to be
+full again is indistinguishable from a new one and is dropped, and the
+in-memory table is capped besides.
+"""
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+ADMISSION_MODE = os.environ.get("ADMISSION_MODE", "queue")  # queue | reject
+ADMISSION_BACKEND = os.environ.get("ADMISSION_BACKEND", "memory")  # memory | sqlite
+ADMISSION_DB = os.environ.get("ADMISSION_DB", "./admission.db")
+MAX_INFLIGHT = int(os.environ.get("ADMISSION_MAX_INFLIGHT", "32"))
+MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "64"))
+QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "30"))
+MAX_UPLOAD_BYTES = int(os.environ.get("ADMISSION_MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+USER_RATE = float(os.environ.get("ADMISSION_USER_RATE", "0.5"))  # requests/second
+USER_BURST = float(os.environ.get("ADMISSION_USER_BURST", "10"))
+ARTIST_RATE = float(os.environ.get("ADMISSION_ARTIST_RATE", "1"))
+ARTIST_BURST = float(os.environ.get("ADMISSION_ARTIST_BURST", "20"))
+TRUST_IDENTITY_HEADERS = os.environ.get("ADMISSION_TRUST_IDENTITY_HEADERS", "") == "1"
+MAX_BUCKETS = int(os.environ.get("ADMISSION_MAX_BUCKETS", "100000"))
+ADMISSION_PATHS = ("/chat", "/chat/stream")
+_SWEEP_EVERY = 1024  # SQLite: takes between deletions of full buckets
+
+# (bucket key, refill rate per second, burst capacity)
+Limit = Tuple[str, float, float]
+
+
+def _refill(tokens: float, updated: float, rate: float, burst: float,
+            now: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+def _full_at(tokens: float, rate: float, burst: float, now: float) -> float:
+    """When a bucket left at `tokens` is back to `burst` (and can be dropped)."""
+    return now + (burst - tokens) / rate
+
+
+class MemoryBuckets:
+    """Token buckets in this process's memory, least recently used first."""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        # key -> (tokens, updated, full_at)
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, limits: List[Limit]) -> float:
+        """Take one token from every bucket, or none of them.
+
+        Returns 0 when admitted, else the seconds until all would allow it.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            levels = {key: _refill(*self._buckets.get(key, (burst, now))[:2], rate, burst, now)
+                      for key, rate, burst in limits}
+            wait = max(((1 - levels[key]) / rate
+                        for key, rate, _ in limits if levels[key] < 1), default=0.0)
+            if wait:
+                return wait
+            for key, rate, burst in limits:
+                self._set(key, levels[key] - 1, rate, burst, now)
+            return 0.0
+
+    def refund(self, limits: List[Limit]):
+        """Give back the tokens of a `take` whose request was not admitted."""
+        now = time.monotonic()
+        with self._lock:
+            for key, rate, burst in limits:
+                if key in self._buckets:
+                    tokens = _refill(*self._buckets[key][:2], rate, burst, now)
+                    self._set(key, min(burst, tokens + 1), rate, burst, now)
+
+    def _set(self, key: str, tokens: float, rate: float, burst: float, now: float):
+        # Caller holds the lock
+        self._buckets[key] = (tokens, now, _full_at(tokens, rate, burst, now))
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+
+    def _expire(self, now: float):
+        # Caller holds the lock; full buckets behave exactly like absent ones
+        while self._buckets:
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now:
+                break
+            del self._buckets[key]
+
+
+class SQLiteBuckets:
+    """Token buckets in a local SQLite file, shared by processes on the host."""
+
+    def __init__(self, path: str = "./admission.db"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL,"
+            " full_at REAL NOT NULL DEFAULT 0)")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(buckets)")]
+        if "full_at" not in columns:
+            # Older files: existing rows count as full and are swept
+            self._db.execute("ALTER TABLE buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at)")
+        self._takes = 0
+
+    def take(self, limits: List[Limit]) -> float:
+        # Wall clock: monotonic time is not comparable across processes
+        now = time.time()
+        with self._lock:
+            self._takes += 1
+            if self._takes % _SWEEP_EVERY == 0:
+                self._db.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                levels = {}
+                for key, rate, burst in limits:
+                    row = self._db.execute(
+                        "SELECT tokens, updated FROM buckets WHERE key = ?",
+                        (key,)).fetchone()
+                    levels[key] = _refill(*(row or (burst, now)), rate, burst, now)
+                wait = max(((1 - levels[key]) / rate
+                            for key, rate, _ in limits if levels[key] < 1), default=0.0)
+                if not wait:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)",
+                        [(key, levels[key] - 1, now,
+                          _full_at(levels[key] - 1, rate, burst, now))
+                         for key, rate, burst in limits])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            return wait
+
+    def refund(self, limits: List[Limit]):
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for key, rate, burst in limits:
+                    row = self._db.execute(
+                        "SELECT tokens, updated FROM buckets WHERE key = ?",
+                        (key,)).fetchone()
+                    if row:
+                        tokens = min(burst, _refill(*row, rate, burst, now) + 1)
+                        self._db.execute(
+                            "UPDATE buckets SET tokens = ?, updated = ?, full_at = ?"
+                            " WHERE key = ?",
+                            (tokens, now, _full_at(tokens, rate, burst, now), key))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+
+def make_backend(kind: str = ADMISSION_BACKEND, path: str = ADMISSION_DB):
+    if kind == "memory":
+        return MemoryBuckets()
+    if kind == "sqlite":
+        return SQLiteBuckets(path)
+    raise ValueError(f"Unknown admission backend {kind!r}")
+
+
+class _Rejected(Exception):
+    def __init__(self, status: int, error: str, retry_after: Optional[float] = None):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+        self.retry_after = retry_after
+
+
+class AdmissionControl:
+    """Limits and counters shared by the middleware and the stats route."""
+
+    def __init__(self, mode: str = ADMISSION_MODE, backend=None,
+                 max_inflight: int = MAX_INFLIGHT, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT,
+                 max_upload_bytes: int = MAX_UPLOAD_BYTES,
+                 user_limit: Tuple[float, float] = (USER_RATE, USER_BURST),
+                 artist_limit: Tuple[float, float] = (ARTIST_RATE, ARTIST_BURST),
+                 trust_identity_headers: bool = TRUST_IDENTITY_HEADERS):
+        if mode not in ("queue", "reject"):
+            raise ValueError(f"Unknown admission mode {mode!r}")
+        self.mode = mode
+        self.backend = backend or make_backend()
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout if mode == "queue" else 0.0
+        self.max_upload_bytes = max_upload_bytes
+        self.user_limit = user_limit
+        self.artist_limit = artist_limit
+        self.trust_identity_headers = trust_identity_headers
+        self.inflight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected: Dict[int, int] = {}
+        self._slots = asyncio.Semaphore(max_inflight)
+
+    async def admit(self, limits: List[Limit]):
+        """Wait for tokens and a slot; raises _Rejected when out of time."""
+        deadline = time.monotonic() + self.queue_timeout
+        await self._take_tokens(limits, deadline)
+        try:
+            await self._acquire_slot(deadline)
+        except BaseException:
+            # Not admitted: the caller's budget was not spent
+            if limits:
+                await asyncio.to_thread(self.backend.refund, limits)
+            raise
+        self.inflight += 1
+        self.admitted += 1
+
+    def release(self):
+        self.inflight -= 1
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "backend": type(self.backend).__name__,
+                "trust_identity_headers": self.trust_identity_headers,
+                "inflight": self.inflight, "max_inflight": self.max_inflight,
+                "queued": self.queued, "admitted": self.admitted,
+                "rejected": dict(self.rejected)}
+
+    def identify(self, scope, headers: Dict[str, str]) -> Tuple[str, Optional[str]]:
+        """(caller, artist) to rate-limit a request by.
+
+        Identity headers are client-controlled, so they are only honoured
+        when a trusted proxy sets them; otherwise the client address is the
+        caller and there is no artist budget.
+        """
+        client = scope.get("client")
+        address = client[0] if client else "anonymous"
+        if not self.trust_identity_headers:
+            return address, None
+        return headers.get("x-user-id") or address, headers.get("x-artist-id")
+
+    def limits_for(self, user: str, artist: Optional[str]) -> List[Limit]:
+        limits = [(f"user:{user}", *self.user_limit)]
+        if artist:
+            limits.append((f"artist:{artist}", *self.artist_limit))
+        return [limit for limit in limits if limit[1] > 0]
+
+    async def _take_tokens(self, limits: List[Limit], deadline: float):
+        if not limits:
+            return
+        while True:
+            # SQLite may block on another process's transaction
+            wait = await asyncio.to_thread(self.backend.take, limits)
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise _Rejected(429, "Rate limit exceeded", retry_after=wait)
+            await asyncio.sleep(wait)
+
+    async def _acquire_slot(self, deadline: float):
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return
+        timeout = deadline - time.monotonic()
+        if timeout <= 0 or self.queued >= self.max_queue:
+            raise _Rejected(503, "Server busy; too many uploads in flight",
+                            retry_after=1.0)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise _Rejected(503, "Server busy; too many uploads in flight",
+                            retry_after=1.0)
+        finally:
+            self.queued -= 1
+
+
+class AdmissionMiddleware:
+    """Pure-ASGI admission control for POSTs to `paths`."""
+
+    def __init__(self, app, control: AdmissionControl, paths=ADMISSION_PATHS):
+        self.app = app
+        self.control = control
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "POST"
+                or scope["path"] not in self.paths):
+            return await self.app(scope, receive, send)
+        headers = {k.decode("latin-1"): v.decode("latin-1")
+                   for k, v in scope.get("headers") or []}
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            length = 0
+        if length > self.control.max_upload_bytes:
+            return await self._reject(scope, send, _Rejected(413, self._too_large()))
+        user, artist = self.control.identify(scope, headers)
+        try:
+            await self.control.admit(self.control.limits_for(user, artist))
+        except _Rejected as e:
+            return await self._reject(scope, send, e)
+        try:
+            await self._run_limited(scope, receive, send)
+        finally:
+            self.control.release()
+
+    async def _run_limited(self, scope, receive, send):
+        limit = self.control.max_upload_bytes
+        received = 0
+        state = {"started": False, "aborted": False}
+
+        async def limited_receive():
+            nonlocal received
+            if state["aborted"]:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Answer now and make the app see a client that went away
+                    state["aborted"] = True
+                    if not state["started"]:
+                        state["started"] = True
+                        await self._reject(scope, send, _Rejected(413, self._too_large()))
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if state["aborted"]:
+                return
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # The app failing on the cut-off body is expected; 413 is sent
+            if not state["aborted"]:
+                raise
+
+    def _too_large(self) -> str:
+        return f"Upload exceeds {self.control.max_upload_bytes} bytes"
+
+    async def _reject(self, scope, send, e: _Rejected):
+        from fastapi.responses import JSONResponse
+
+        rejected = self.control.rejected
+        rejected[e.status] = rejected.get(e.status, 0) + 1
+        headers = {}
+        if e.retry_after is not None:
+            headers["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+        response = JSONResponse(status_code=e.status, content={"error": e.error},
+                                headers=headers)
+        await response(scope, _no_receive, send)
+
+
+async def _no_receive():
+    return {"type": "http.disconnect"}
+
+
+def install(app, control: Optional[AdmissionControl] = None) -> AdmissionControl:
+    """Add admission control to `app` plus a GET /admission stats route."""
+    control = control or AdmissionControl()
+    app.add_middleware(AdmissionMiddleware, control=control)
+
+    @app.get("/admission", include_in_schema=False)
+    def admission_stats():
+        return control.stats()
+
+    return control
@@ -1,25 +1,182 @@
 # agents/crew_runtime.py
-import httpx
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+from agents.tool_gateway import ToolGateway, get_gateway
 from memory_hub import MemoryHub
+from tracing import span
+
+JOB_POLL_INTERVAL = 0.5
+JOB_TIMEOUT = 300
+# Independent tool calls of one chat turn run side by side, each tool on
+# its own pool: a mastering step holds its thread while it polls the job
+# (up to JOB_TIMEOUT), which must never leave art calls waiting for one
+TOOL_WORKERS = int(os.environ.get("LABELHEAD_TOOL_WORKERS", "16"))
+_tool_pools = {tool: ThreadPoolExecutor(max_workers=TOOL_WORKERS,
+                                        thread_name_prefix=f"labelhead-{tool}")
+               for tool in ("mastering", "art")}
+
+Emit = Callable[..., None]
+
+class Cancelled(Exception):
+    """The client went away; stop working on its turn."""
 
 class LabelHead:
-    def __init__(self, memory: MemoryHub):
+    def __init__(self, memory: MemoryHub, gateway: Optional[ToolGateway] = None):
         self.memory = memory
+        self.gateway = gateway or get_gateway()
 
     def handle(self, message: str, file) -> dict:
-        try:
-            # Forward file to the MCP mastering server on port 8001
-            files = {"file": (file.filename, file.file, file.content_type)}
-            r = httpx.post(
-                "http://localhost:8001/master",
-                files=files,
-                data={"target_loudness": -14, "genre": "pop"}
-            )
-            r.raise_for_status()
-            wav_url = r.json()["wav_url"]
+        """Run a whole turn and return only the final card (or error)."""
+        result = {}
+        for event in self.stream(message, file):
+            if event["event"] == "card":
+                result = {"card": event["data"]}
+            elif event["event"] == "error":
+                result = event["data"]
+        return result
+
+    def stream(self, message: str, file,
+               cancel: Optional[threading.Event] = None) -> Iterator[dict]:
+        """Run a turn, yielding {"event", "data"} progress events.
+
+        Ends with a "card" or "error" event. Setting `cancel` (e.g. when
+        the client disconnects) ends the stream and cancels the mastering
+        job on its server.
+        """
+        cancel = cancel or threading.Event()
+        events: "queue.Queue[Optional[dict]]" = queue.Queue()
+
+        def emit(event: str, **data):
+            events.put({"event": event, "data": data})
+
+        # Chat turns only need to live for the session: keep them in the
+        # rush tier and let them expire instead of writing them to disk
+        doc_id = self.memory.save("user", "demo",
+                                  {"message": message, "filename": file.filename},
+                                  important=False)
+        yield {"event": "received", "data": {"filename": file.filename}}
+        yield {"event": "memory", "data": {"agent": "user", "id": doc_id}}
 
-            # Persist & return
-            self.memory.save("mastering", "demo", {"wav_url": wav_url})
-            return {"card": {"type": "mastering", "wav_url": wav_url}}
-        except Exception as e:
-            return {"error": f"Mastering failed: {str(e)}"}
+        # Mastering and cover art don't depend on each other: run both at
+        # once so the turn takes as long as the slower one, not the sum.
+        # Each step persists its own result as soon as it finishes.
+        prompt = message.strip() or os.path.splitext(file.filename)[0]
+        # Each step runs in a copy of this context so its spans join the trace
+        steps = {"mastering": _tool_pools["mastering"].submit(
+                     contextvars.copy_context().run, self._master, file, emit, cancel),
+                 "art": _tool_pools["art"].submit(
+                     contextvars.copy_context().run, self._art, prompt, emit)}
+        for future in steps.values():
+            # Queued after the step's own events, so it marks the end of them
+            future.add_done_callback(lambda _: events.put(None))
+
+        running = len(steps)
+        while running:
+            try:
+                event = events.get(timeout=JOB_POLL_INTERVAL)
+            except queue.Empty:
+                if cancel.is_set():
+                    return
+                continue
+            if event is None:
+                running -= 1
+            else:
+                yield event
+
+        card = {"type": "release"}
+        errors = {}
+        for name, future in steps.items():
+            try:
+                card.update(future.result())
+            except Exception as e:
+                errors[name] = f"{name.capitalize()} failed: {str(e)}"
+        if len(errors) == len(steps):
+            yield {"event": "error", "data": {"error": "; ".join(errors.values())}}
+            return
+        if errors:
+            card["errors"] = errors
+        yield {"event": "card", "data": card}
+
+    def _master(self, file, emit: Emit, cancel: threading.Event) -> dict:
+        with span("labelhead.mastering"):
+            return self._run_master(file, emit, cancel)
+
+    def _run_master(self, file, emit: Emit, cancel: threading.Event) -> dict:
+        # Forward file to a mastering MCP replica via the tool gateway
+        emit("mastering", status="uploading")
+        mastering = self.gateway.tool("mastering")
+        files = {"file": (file.filename, file.file, file.content_type)}
+        r = mastering.post(
+            "/master",
+            files=files,
+            data={"target_loudness": -14, "genre": "pop"}
+        )
+        r.raise_for_status()
+        job = r.json()
+        # The server fingerprints uploads; re-encodes of a known recording
+        # share its track_id (results are still per exact upload)
+        track = job.get("track") or {}
+        if track.get("duplicate_of"):
+            emit("mastering", status="duplicate", track_id=track["track_id"],
+                 match=track.get("match"))
+        if job["status"] == "done":
+            # Served straight from the mastering result cache
+            wav_url = job["result"]["wav_url"]
+        else:
+            emit("mastering", status="queued", job_id=job["job_id"])
+            wav_url = self._wait_for_job(job["job_id"], mastering.replica_of(r),
+                                         emit, cancel)["wav_url"]
+        emit("mastering", status="done", wav_url=wav_url)
+        linked = {k: track[k] for k in ("track_id", "duplicate_of") if track.get(k)}
+        doc_id = self.memory.save("mastering", "demo", {"wav_url": wav_url, **linked})
+        emit("memory", agent="mastering", id=doc_id)
+        return {"wav_url": wav_url, **linked}
+
+    def _art(self, prompt: str, emit: Emit) -> dict:
+        with span("labelhead.art"):
+            return self._run_art(prompt, emit)
+
+    def _run_art(self, prompt: str, emit: Emit) -> dict:
+        emit("art", status="generating")
+        r = self.gateway.tool("art").post(
+            "/art", json={"prompt": prompt, "release_id": "demo"})
+        r.raise_for_status()
+        art = r.json()
+        if "error" in art:
+            raise RuntimeError(art["error"])
+        emit("art", status="done", cover_url=art["cover_url"])
+        doc_id = self.memory.save("art", "demo", {"prompt": prompt,
+                                                  "cover_url": art["cover_url"]})
+        emit("memory", agent="art", id=doc_id)
+        return {"cover_url": art["cover_url"],
+                "cover_derivatives": art.get("derivatives", [])}
+
+    def _wait_for_job(self, job_id: str, replica: str, emit: Emit,
+                      cancel: threading.Event) -> dict:
+        # Poll the mastering job on the replica that owns it until it
+        # finishes, we give up, or the client leaves
+        mastering = self.gateway.tool("mastering")
+        deadline = time.monotonic() + JOB_TIMEOUT
+        last = None
+        while time.monotonic() < deadline:
+            if cancel.is_set():
+                mastering.delete(f"/master/{job_id}", replica=replica)
+                raise Cancelled(f"Mastering job {job_id} cancelled")
+            r = mastering.get(f"/master/{job_id}", replica=replica)
+            r.raise_for_status()
+            job = r.json()
+            if job["status"] == "done":
+                return job["result"]
+            if job["status"] in ("failed", "cancelled"):
+                raise RuntimeError(job["error"] or f"Job {job['status']}")
+            if (job["status"], job["progress"]) != last:
+                last = (job["status"], job["progress"])
+                emit("mastering", status=job["status"], progress=job["progress"])
+            cancel.wait(JOB_POLL_INTERVAL)
+        raise TimeoutError(f"Mastering job {job_id} did not finish in {JOB_TIMEOUT}s")
@@ -0,0 +1,319 @@
+# agents/tool_gateway.py
+"""Client side of the MCP tool servers.
+
+A registry maps tool names ("mastering", "art") to one or more replica
+base URLs. Each replica keeps a pooled httpx.Client (HTTP/2 when the `h2`
+package is installed), its own circuit breaker and a health flag kept
+fresh by a background checker. Requests go to the least-busy healthy
+replica, are capped per tool, and are retried with jittered backoff on
+another replica when that is safe, so one slow or dead instance cannot
+stall every chat.
+"""
+import importlib.util
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from tracing import outgoing_headers, span
+
+logger = logging.getLogger(__name__)
+
+HTTP2 = importlib.util.find_spec("h2") is not None
+HEALTH_INTERVAL = float(os.environ.get("MCP_HEALTH_INTERVAL", "10"))
+BREAKER_FAILURES = 5
+BREAKER_RESET_SECONDS = 30.0
+RETRY_BACKOFF = 0.2
+# Statuses that mean the request was not processed, so any method may retry
+REJECTED_STATUSES = {429, 503}
+# Statuses/timeouts that are only safe to retry for idempotent requests
+AMBIGUOUS_STATUSES = {500, 502, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class ToolError(Exception):
+    """Base class for gateway failures."""
+
+
+class ToolUnavailableError(ToolError):
+    """No replica of the tool is currently accepting requests."""
+
+
+class ToolBusyError(ToolError):
+    """The tool's concurrency limit stayed exhausted for the whole timeout."""
+
+
+@dataclass
+class ToolConfig:
+    name: str
+    urls: List[str]
+    timeout: float = 30.0
+    connect_timeout: float = 3.0
+    max_concurrency: int = 16
+    retries: int = 2
+    health_path: str = "/health"
+
+
+def _urls(env: str, default: str) -> List[str]:
+    return [u.strip().rstrip("/") for u in os.environ.get(env, default).split(",")
+            if u.strip()]
+
+
+def default_registry() -> Dict[str, ToolConfig]:
+    """Tool endpoints from MCP_<TOOL>_URLS (comma-separated replicas)."""
+    return {
+        "mastering": ToolConfig("mastering", _urls("MCP_MASTERING_URLS", "http://localhost:8001"),
+                                timeout=60.0, max_concurrency=32),
+        "art": ToolConfig("art", _urls("MCP_ART_URLS", "http://localhost:8002"),
+                          timeout=120.0, max_concurrency=16),
+    }
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive errors; probes again after `reset`."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES,
+                 reset: float = BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset = reset
+        self.state = "closed"  # closed -> open -> half_open -> closed | open
+        self._errors = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset:
+                self.state = "half_open"  # let one trial request through
+                return True
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._errors = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._errors += 1
+            if self.state == "half_open" or self._errors >= self.failures:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+@dataclass
+class Replica:
+    url: str
+    client: httpx.Client
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    healthy: bool = True
+    inflight: int = 0
+    latency: float = 0.0  # EWMA seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"url": self.url, "healthy": self.healthy,
+                "breaker": self.breaker.state, "inflight": self.inflight,
+                "latency_ms": round(self.latency * 1000, 1)}
+
+
+class ToolClient:
+    """Pooled, limited, retrying client for all replicas of one tool."""
+
+    def __init__(self, config: ToolConfig):
+        if not config.urls:
+            raise ValueError(f"Tool {config.name!r} has no endpoints")
+        self.config = config
+        timeout = httpx.Timeout(config.timeout, connect=config.connect_timeout)
+        limits = httpx.Limits(max_connections=config.max_concurrency,
+                              max_keepalive_connections=config.max_concurrency)
+        self.replicas = [Replica(url, httpx.Client(base_url=url, timeout=timeout,
+                                                   limits=limits, http2=HTTP2))
+                         for url in config.urls]
+        self._slots = threading.BoundedSemaphore(config.max_concurrency)
+        self._lock = threading.Lock()
+
+    def get(self, path: str, **kwargs) -> httpx.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> httpx.Response:
+        return self.request("POST", path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> httpx.Response:
+        return self.request("DELETE", path, **kwargs)
+
+    def request(self, method: str, path: str, replica: Optional[str] = None,
+                idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """Send a request to the best replica, retrying where safe.
+
+        `replica` pins the request to one base URL (e.g. to poll a job on
+        the instance that owns it). Non-2xx responses that are not retried
+        are returned as-is for the caller to inspect.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if not self._slots.acquire(timeout=self.config.timeout):
+            raise ToolBusyError(f"{self.config.name} is at its concurrency limit "
+                                f"({self.config.max_concurrency})")
+        try:
+            tried: List[Replica] = []
+            for attempt in range(self.config.retries + 1):
+                if attempt:
+                    # Full jitter keeps retrying callers from synchronizing
+                    time.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** attempt))
+                target = self._pick(replica, tried)
+                tried.append(target)
+                _rewind(kwargs.get("files"))
+                try:
+                    response = self._send(target, method, path, **kwargs)
+                except httpx.TransportError as e:
+                    # Nothing reached the server unless we were mid-request
+                    retryable = idempotent or isinstance(e, httpx.ConnectError)
+                    if not retryable or attempt == self.config.retries:
+                        raise
+                    logger.warning("%s %s on %s failed: %s; retrying",
+                                   method, path, target.url, e)
+                    continue
+                retryable = (response.status_code in REJECTED_STATUSES
+                             or (idempotent and response.status_code in AMBIGUOUS_STATUSES))
+                if not retryable or attempt == self.config.retries:
+                    return response
+            raise AssertionError("unreachable")
+        finally:
+            self._slots.release()
+
+    def replica_of(self, response: httpx.Response) -> str:
+        """Base URL of the replica that served `response`."""
+        url = str(response.request.url)
+        return max((r.url for r in self.replicas if url.startswith(r.url + "/")),
+                   key=len, default=url)
+
+    def check_health(self):
+        for r in self.replicas:
+            try:
+                ok = r.client.get(self.config.health_path, timeout=2.0).status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok != r.healthy:
+                logger.info("%s replica %s is now %s", self.config.name, r.url,
+                            "healthy" if ok else "unhealthy")
+            r.healthy = ok
+
+    def stats(self) -> Dict[str, Any]:
+        return {"replicas": [r.to_dict() for r in self.replicas],
+                "max_concurrency": self.config.max_concurrency}
+
+    def close(self):
+        for r in self.replicas:
+            r.client.close()
+
+    def _pick(self, pinned: Optional[str], tried: List[Replica]) -> Replica:
+        if pinned is not None:
+            for r in self.replicas:
+                if r.url == pinned.rstrip("/"):
+                    if not r.breaker.allow():
+                        raise ToolUnavailableError(f"{self.config.name} replica {r.url} "
+                                                   f"is failing; circuit open")
+                    return r
+            raise ToolUnavailableError(f"Unknown {self.config.name} replica {pinned}")
+        with self._lock:
+            # Prefer healthy, untried replicas; fall back to anything whose
+            # breaker lets a request through (health may be stale)
+            candidates = sorted(self.replicas, key=lambda r: (
+                not r.healthy, r in tried, r.inflight, r.latency))
+        for r in candidates:
+            if r.breaker.allow():
+                return r
+        raise ToolUnavailableError(f"No {self.config.name} replica is available")
+
+    def _send(self, r: Replica, method: str, path: str, **kwargs) -> httpx.Response:
+        with self._lock:
+            r.inflight += 1
+        started = time.perf_counter()
+        try:
+            with span(f"tool.{self.config.name}", method=method, path=path,
+                      replica=r.url):
+                # Carry the trace into the tool server
+                traced = outgoing_headers()
+                if traced:
+                    kwargs["headers"] = {**(kwargs.get("headers") or {}), **traced}
+                response = r.client.request(method, path, **kwargs)
+        except httpx.TransportError:
+            r.breaker.record_failure()
+            raise
+        finally:
+            with self._lock:
+                r.inflight -= 1
+        elapsed = time.perf_counter() - started
+        r.latency = elapsed if not r.latency else 0.8 * r.latency + 0.2 * elapsed
+        if response.status_code >= 500:
+            r.breaker.record_failure()
+        else:
+            r.breaker.record_success()
+        return response
+
+
+def _rewind(files):
+    # Upload bodies are file objects; a retry must resend them from the top
+    if not files:
+        return
+    values = files.values() if isinstance(files, dict) else (v for _, v in files)
+    for value in values:
+        fileobj = value[1] if isinstance(value, tuple) else value
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+
+
+class ToolGateway:
+    """Registry of ToolClients plus the background health checker."""
+
+    def __init__(self, registry: Optional[Dict[str, ToolConfig]] = None,
+                 health_interval: float = HEALTH_INTERVAL):
+        self.tools = {name: ToolClient(config)
+                      for name, config in (registry or default_registry()).items()}
+        self.health_interval = health_interval
+        self._stop = threading.Event()
+        self._health_thread = None
+        if health_interval > 0:
+            self._health_thread = threading.Thread(
+                target=self._health_loop, name="tool-health", daemon=True)
+            self._health_thread.start()
+
+    def tool(self, name: str) -> ToolClient:
+        try:
+            return self.tools[name]
+        except KeyError:
+            raise ToolUnavailableError(f"No tool named {name!r} is registered")
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: client.stats() for name, client in self.tools.items()}
+
+    def close(self):
+        self._stop.set()
+        for client in self.tools.values():
+            client.close()
+
+    def _health_loop(self):
+        while True:
+            for client in self.tools.values():
+                client.check_health()
+            if self._stop.wait(self.health_interval):
+                return
+
+
+_gateway: Optional[ToolGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> ToolGateway:
+    """Process-wide gateway, created on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = ToolGateway()
+        return _gateway
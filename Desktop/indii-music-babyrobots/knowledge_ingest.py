@@ -0,0 +1,279 @@
+"""Bulk-load knowledge-base markdown into MemoryHub.
+
+Reads the files written by knowledge_reinforcer (YAML front matter plus a
+markdown body), splits each into overlapping chunks along headings,
+paragraphs and sentences, and upserts them into the crash tier in
+batches. Chunk ids are content hashes and a manifest of file hashes makes
+re-runs incremental: unchanged files are skipped, chunks of deleted files
+(and text gone from edited ones) are deleted, and every chunk of an edited
+file is re-upserted so front matter, section and position metadata never
+go stale (unchanged text is served from the embedding cache).
+
+Usage: python knowledge_ingest.py ./knowledge_base [--persist-dir ./chroma_db]
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import yaml
+
+from memory_hub import MemoryHub, make_embedder
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+UPSERT_BATCH = 256
+SEPARATORS = ["\n\n", "\n", ". ", " "]
+KNOWLEDGE_AGENT = "knowledge"
+KNOWLEDGE_RELEASE_ID = "knowledge-base"
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+
+
+@dataclass
+class Chunk:
+    id: str
+    text: str
+    metadata: Dict[str, Any]
+
+
+def parse_front_matter(text: str) -> Tuple[Dict[str, Any], str]:
+    """Split a `---` YAML front matter block from the markdown body."""
+    if text.startswith("---\n"):
+        end = text.find("\n---", 4)
+        if end != -1:
+            meta = yaml.safe_load(text[4:end]) or {}
+            body = text[end + 4:].lstrip("-").lstrip("\n")
+            return (meta if isinstance(meta, dict) else {}), body
+    return {}, text
+
+
+def _flatten(meta: Dict[str, Any]) -> Dict[str, Any]:
+    # Chroma metadata values must be scalars
+    flat = {}
+    for key, value in meta.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(str(v) for v in value)
+        elif isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        elif not isinstance(value, (str, int, float, bool)):
+            value = json.dumps(value, default=str)
+        flat[str(key)] = value
+    return flat
+
+
+def sections(body: str) -> Iterator[Tuple[str, str]]:
+    """Yield (heading path, text) per heading-delimited section.
+
+    Headings inside fenced code blocks are not section breaks.
+    """
+    path: List[Tuple[int, str]] = []
+    lines: List[str] = []
+    in_fence = False
+    for line in body.splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING.match(line)
+        if match:
+            if any(l.strip() for l in lines):
+                yield " > ".join(h for _, h in path), "\n".join(lines)
+            level = len(match.group(1))
+            path = [(l, h) for l, h in path if l < level]
+            path.append((level, match.group(2).strip()))
+            lines = [line]
+        else:
+            lines.append(line)
+    if any(l.strip() for l in lines):
+        yield " > ".join(h for _, h in path), "\n".join(lines)
+
+
+def split_text(text: str, chunk_size: int = CHUNK_SIZE,
+               overlap: int = CHUNK_OVERLAP,
+               separators: List[str] = SEPARATORS) -> List[str]:
+    """Recursively split `text` into chunks of at most `chunk_size` chars.
+
+    Tries paragraph, line, sentence and word boundaries in that order and
+    carries roughly `overlap` trailing characters into the next chunk.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if len(text) <= chunk_size:
+        return [text]
+    sep = next((s for s in separators if s in text), None)
+    if sep is None:
+        step = chunk_size - overlap
+        return [text[i:i + chunk_size]
+                for i in range(0, max(1, len(text) - overlap), step)]
+    rest = separators[separators.index(sep) + 1:]
+    parts = text.split(sep)
+    units = []
+    for piece in [p + sep for p in parts[:-1]] + [parts[-1]]:
+        if not piece.strip():
+            continue
+        if len(piece) > chunk_size:
+            units.extend(s + " " for s in split_text(piece, chunk_size, overlap, rest))
+        else:
+            units.append(piece)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    length = 0
+    for unit in units:
+        if current and length + len(unit) > chunk_size:
+            chunk = "".join(current).strip()
+            chunks.append(chunk)
+            while current and (length > overlap or length + len(unit) > chunk_size):
+                length -= len(current.pop(0))
+            if not current and overlap:
+                # No whole unit fits in the overlap; carry a word-aligned tail
+                tail = chunk[-overlap:]
+                tail = tail[tail.find(" ") + 1:] if " " in tail else tail
+                if tail and len(tail) + 1 + len(unit) <= chunk_size:
+                    current, length = [tail + " "], len(tail) + 1
+        current.append(unit)
+        length += len(unit)
+    if current:
+        chunks.append("".join(current).strip())
+    return [c for c in chunks if c]
+
+
+def chunk_document(source: str, text: str, chunk_size: int = CHUNK_SIZE,
+                   overlap: int = CHUNK_OVERLAP) -> List[Chunk]:
+    """Chunk one knowledge-base file; front matter becomes chunk metadata."""
+    front_matter, body = parse_front_matter(text)
+    base = _flatten(front_matter)
+    chunks: Dict[str, Chunk] = {}
+    for section, section_text in sections(body):
+        for piece in split_text(section_text, chunk_size, overlap):
+            chunk_id = hashlib.sha256(f"{source}\0{piece}".encode()).hexdigest()
+            if chunk_id in chunks:
+                continue  # identical text twice in one file
+            chunks[chunk_id] = Chunk(chunk_id, piece, {
+                **base,
+                "agent": KNOWLEDGE_AGENT,
+                "release_id": KNOWLEDGE_RELEASE_ID,
+                "source": source,
+                "section": section,
+                "chunk": len(chunks),
+            })
+    return list(chunks.values())
+
+
+class KnowledgeIngestor:
+    """Incrementally syncs a directory of markdown files into a MemoryHub."""
+
+    def __init__(self, hub: MemoryHub, manifest_path: str = "./knowledge_manifest.db",
+                 chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                 batch_size: int = UPSERT_BATCH):
+        self.hub = hub
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.db = sqlite3.connect(manifest_path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS files ("
+                        " path TEXT PRIMARY KEY, mtime REAL, size INTEGER,"
+                        " sha256 TEXT, chunk_ids TEXT)")
+        self.db.commit()
+        self._pending: List[Chunk] = []
+        self._pending_rows: List[Tuple] = []
+        self.stats: Dict[str, Any] = {}
+
+    def sync(self, root: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self.stats = {"files": 0, "changed": 0, "unchanged": 0, "removed": 0,
+                      "chunks_upserted": 0, "chunks_deleted": 0}
+        known = {path: (mtime, size, sha, json.loads(ids)) for path, mtime, size, sha, ids
+                 in self.db.execute("SELECT * FROM files")}
+        seen = set()
+        root_path = Path(root)
+        for path in sorted(root_path.rglob("*.md")):
+            rel = path.relative_to(root_path).as_posix()
+            seen.add(rel)
+            self.stats["files"] += 1
+            self._sync_file(path, rel, known.get(rel))
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+        # Files that disappeared take their chunks with them
+        for rel in set(known) - seen:
+            self.hub.delete(known[rel][3], KNOWLEDGE_AGENT, KNOWLEDGE_RELEASE_ID)
+            self.stats["chunks_deleted"] += len(known[rel][3])
+            self.stats["removed"] += 1
+            self.db.execute("DELETE FROM files WHERE path = ?", (rel,))
+        self._flush()
+        self.stats["seconds"] = round(time.perf_counter() - started, 3)
+        return self.stats
+
+    def _sync_file(self, path: Path, rel: str, known):
+        st = path.stat()
+        if known and known[0] == st.st_mtime and known[1] == st.st_size:
+            self.stats["unchanged"] += 1
+            return
+        raw = path.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        if known and known[2] == digest:
+            # Touched but not edited
+            self.db.execute("UPDATE files SET mtime = ?, size = ? WHERE path = ?",
+                            (st.st_mtime, st.st_size, rel))
+            self.stats["unchanged"] += 1
+            return
+        chunks = chunk_document(rel, raw.decode("utf-8", errors="replace"),
+                                self.chunk_size, self.overlap)
+        old_ids = set(known[3]) if known else set()
+        new_ids = [c.id for c in chunks]
+        stale = list(old_ids - set(new_ids))
+        self.hub.delete(stale, KNOWLEDGE_AGENT, KNOWLEDGE_RELEASE_ID)
+        self.stats["chunks_deleted"] += len(stale)
+        # All of them, not just new ids: an edit to the front matter or the
+        # layout changes the metadata of chunks whose text did not change
+        now = time.time()
+        for chunk in chunks:
+            chunk.metadata.update(content_hash=digest, created_at=now)
+            self._pending.append(chunk)
+        self._pending_rows.append((rel, st.st_mtime, st.st_size, digest,
+                                   json.dumps(new_ids)))
+        self.stats["changed"] += 1
+
+    def _flush(self):
+        # Manifest rows are committed only once their chunks are stored, so
+        # an interrupted run simply redoes those files next time
+        for i in range(0, len(self._pending), self.batch_size):
+            batch = self._pending[i:i + self.batch_size]
+            self.hub.upsert_documents([c.id for c in batch],
+                                      [c.text for c in batch],
+                                      [c.metadata for c in batch])
+            self.stats["chunks_upserted"] += len(batch)
+        self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                            self._pending_rows)
+        self.db.commit()
+        self._pending, self._pending_rows = [], []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="knowledge base directory (*.md)")
+    parser.add_argument("--persist-dir", default="./chroma_db")
+    parser.add_argument("--manifest", default="./knowledge_manifest.db")
+    parser.add_argument("--embedder", default=None, help="onnx or hash")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP)
+    args = parser.parse_args()
+
+    embedder = make_embedder(args.embedder) if args.embedder else None
+    hub = MemoryHub(args.persist_dir, embedder=embedder)
+    ingestor = KnowledgeIngestor(hub, args.manifest, args.chunk_size, args.overlap)
+    print(json.dumps(ingestor.sync(args.root), indent=2))
+    hub.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
+import json
+import threading
+
 from fastapi import FastAPI, Form, UploadFile, File
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from admission import install as install_admission
 from agents.crew_runtime import LabelHead
 from memory_hub import MemoryHub
+from tracing import install as install_tracing
 
 app = FastAPI()
+# Public edge: clients cannot force sampling with their own X-Trace-Id
+install_tracing(app, "main-api", trust_incoming=False)
+install_admission(app)
 mem = MemoryHub()
 
 @app.get("/")
@@ -14,3 +24,25 @@ def health():
 def chat(message: str = Form(...), file: UploadFile = File(...)):
     lh = LabelHead(memory=mem)
     return lh.handle(message, file)
+
+@app.post("/chat/stream")
+async def chat_stream(message: str = Form(...), file: UploadFile = File(...)):
+    """Server-sent events for one turn: progress first, the card last."""
+    lh = LabelHead(memory=mem)
+    cancel = threading.Event()
+    events = lh.stream(message, file, cancel)
+
+    async def sse():
+        try:
+            while True:
+                event = await run_in_threadpool(next, events, None)
+                if event is None:
+                    break
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            # Client gone (or done): stop polling and cancel server-side work
+            cancel.set()
+            await file.close()
+
+    return StreamingResponse(sse(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
@@ -1,22 +1,714 @@
-import uuid
+import atexit
+import hashlib
 import json
-import chromadb
+import logging
 import os
-from typing import Any, Dict
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import chromadb
+from chromadb.errors import NotFoundError
+import numpy as np
+
+from tracing import span
 
 # Fix tokenizer parallelism warning
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
+logger = logging.getLogger(__name__)
+
+RUSH_TTL_SECONDS = float(os.environ.get("MEMORY_RUSH_TTL_SECONDS", "1800"))
+RUSH_MAX_BYTES = int(os.environ.get("MEMORY_RUSH_MAX_BYTES", str(64 * 1024 ** 2)))
+SPILL_BATCH_SIZE = 64
+SPILL_MAX_ATTEMPTS = 3
+EMBEDDER = os.environ.get("MEMORY_EMBEDDER", "onnx")
+EMBEDDING_CACHE = os.environ.get("MEMORY_EMBEDDING_CACHE", "./embedding_cache.db")
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_DIM = 384  # matches all-MiniLM-L6-v2, Chroma's default model
+PARTITION_STRATEGY = os.environ.get("MEMORY_PARTITION", "single")
+COLLECTION_NAME = "indii"
+FANOUT_WORKERS = 8
+RECALL_WINDOW_SECONDS = 3600.0  # first created_at window a crash recall reads
+RECALL_WINDOW_GROWTH = 8        # each further window reaches this much further back
+RECALL_UNDATED_PAGE = 256       # page size when falling back to rows without created_at
+
+
+class Embedder:
+    """Turns texts into float32 vectors, shape (len(texts), dim)."""
+
+    name = "base"
+    dim = EMBEDDING_DIM
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def load(self):
+        """Fetch whatever the embedder needs up front; no-op by default."""
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic feature-hashing embedder; no model, no network.
+
+    Words and word bigrams are hashed into `dim` signed buckets and the
+    result is L2-normalized. Good enough for tests and exact-ish recall.
+    """
+
+    _token = re.compile(r"\w+")
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = self._token.findall(text.lower())
+            features = words + [a + " " + b for a, b in zip(words, words[1:])]
+            if not features:
+                continue
+            digests = np.frombuffer(b"".join(
+                hashlib.blake2b(f.encode(), digest_size=8).digest()
+                for f in features), dtype="<u8")
+            signs = np.where(digests >> np.uint64(63), -1.0, 1.0)
+            np.add.at(out[row], (digests % np.uint64(self.dim)).astype(np.intp),
+                      signs)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms == 0, 1, norms)
+
+
+class OnnxEmbedder(Embedder):
+    """all-MiniLM-L6-v2 on CPU via onnxruntime (Chroma's bundled model).
+
+    Chroma fetches the model into its local cache the first time; seed
+    that cache (or use "hash") to run fully offline. MemoryHub calls load()
+    at start-up so a missing model fails there, not in the spill thread.
+    """
+
+    name = "all-MiniLM-L6-v2"
+
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._model is not None:
+                return
+            from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+            model = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+            try:
+                model(["warm-up"])  # downloads and opens the model if needed
+            except Exception as e:
+                raise RuntimeError(
+                    f"Cannot load the {self.name} embedding model ({e}); seed "
+                    f"{model.DOWNLOAD_PATH} or set MEMORY_EMBEDDER=hash") from e
+            self._model = model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        self.load()
+        return np.asarray(self._model(texts), dtype=np.float32)
+
+
+class CachedEmbedder(Embedder):
+    """Batches texts through `backend`, caching vectors by content hash.
+
+    The cache is a SQLite file, so identical payloads are embedded once per
+    machine rather than once per call, and warm restarts skip the model.
+    """
+
+    def __init__(self, backend: Embedder, path: str = EMBEDDING_CACHE,
+                 batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.backend = backend
+        self.name = backend.name
+        self.dim = backend.dim
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings ("
+                         " key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+
+    def load(self):
+        self.backend.load()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.name}\0{text}".encode()).hexdigest()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        keys = [self._key(t) for t in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN"
+                    f" ({','.join('?' * len(chunk))})", chunk).fetchall()
+                for key, blob in rows:
+                    vectors[key] = np.frombuffer(blob, dtype=np.float32)
+        missing = [k for k in unique if k not in vectors]
+        self.hits += len(unique) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            text_for = dict(zip(keys, texts))
+            for i in range(0, len(missing), self.batch_size):
+                batch = missing[i:i + self.batch_size]
+                embedded = self.backend.embed([text_for[k] for k in batch])
+                vectors.update(zip(batch, embedded))
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                    [(k, vectors[k].astype(np.float32).tobytes())
+                     for k in missing])
+                self._db.commit()
+        if not keys:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([vectors[k] for k in keys])
+
+
+def make_embedder(kind: str = EMBEDDER,
+                  cache_path: Optional[str] = EMBEDDING_CACHE) -> Embedder:
+    """Build the configured embedder ("onnx" or "hash"), cached on disk."""
+    backends = {"onnx": OnnxEmbedder, "hash": HashingEmbedder}
+    if kind not in backends:
+        raise ValueError(f"Unknown embedder {kind!r}; expected one of {sorted(backends)}")
+    backend = backends[kind]()
+    return CachedEmbedder(backend, cache_path) if cache_path else backend
+
+
+class PartitionRouter:
+    """Maps (agent, release_id) to the Chroma collection that holds it.
+
+    "single" keeps everything in one collection (the original layout);
+    "agent" gives each agent its own collection and "release" one per
+    release/tenant, so scoped reads, retention and compaction only touch
+    that partition's index.
+    """
+
+    strategies = ("single", "agent", "release")
+
+    def __init__(self, strategy: str = PARTITION_STRATEGY,
+                 base: str = COLLECTION_NAME):
+        if strategy not in self.strategies:
+            raise ValueError(f"Unknown partition strategy {strategy!r}; "
+                             f"expected one of {list(self.strategies)}")
+        self.strategy = strategy
+        self.base = base
+        self.prefix = f"{base}-{strategy}-"
+
+    def route(self, agent: str, release_id: str) -> str:
+        """Collection name for a memory written by `agent` for `release_id`."""
+        if self.strategy == "single":
+            return self.base
+        return self.name_for(agent if self.strategy == "agent" else release_id)
+
+    def scope(self, agent: Optional[str] = None,
+              release_id: Optional[str] = None) -> Optional[str]:
+        """The one partition a read is confined to, or None to fan out."""
+        if self.strategy == "single":
+            return self.base
+        key = agent if self.strategy == "agent" else release_id
+        return None if key is None else self.name_for(key)
+
+    def name_for(self, key: str) -> str:
+        # Chroma names allow [A-Za-z0-9._-] and must end alphanumeric; the
+        # digest keeps sanitized keys from colliding
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "-", str(key))[:48]
+        digest = hashlib.blake2b(str(key).encode(), digest_size=4).hexdigest()
+        return f"{self.prefix}{slug}-{digest}"
+
+    def owns(self, name: str) -> bool:
+        if self.strategy == "single":
+            return name == self.base
+        return name.startswith(self.prefix)
+
+
+@dataclass
+class MemoryEntry:
+    id: str
+    agent: str
+    release_id: str
+    payload: Dict[str, Any]
+    document: str
+    created_at: float = field(default_factory=time.time)
+    expires_at: float = 0.0
+    important: bool = True
+    attempts: int = 0
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return {"agent": self.agent, "release_id": self.release_id,
+                "created_at": self.created_at,
+                "payload_hash": hashlib.sha256(self.document.encode()).hexdigest()}
+
+    @property
+    def size(self) -> int:
+        # Rough resident cost: the serialized payload dominates
+        return sys.getsizeof(self.document) + 256
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "agent": self.agent,
+                "release_id": self.release_id, "payload": self.payload,
+                "created_at": self.created_at}
+
+
+class RushMemory:
+    """Bounded in-process memory tier keyed by session/release id.
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once the tier holds more than `max_bytes`.
+    """
+
+    def __init__(self, ttl: float = RUSH_TTL_SECONDS,
+                 max_bytes: int = RUSH_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, MemoryEntry]" = OrderedDict()
+        self._by_key: Dict[str, "OrderedDict[str, None]"] = {}
+        self._lock = threading.RLock()
+        self._last_sweep = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, entry: MemoryEntry):
+        with self._lock:
+            self._remove(entry.id)
+            entry.expires_at = time.time() + self.ttl
+            self._entries[entry.id] = entry
+            self._by_key.setdefault(entry.release_id, OrderedDict())[entry.id] = None
+            self.bytes += entry.size
+            self._evict()
+
+    def get(self, doc_id: str) -> Optional[MemoryEntry]:
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None:
+                return None
+            if entry.expires_at < time.time():
+                self._remove(doc_id)
+                return None
+            self._entries.move_to_end(doc_id)
+            return entry
+
+    def recent(self, release_id: str, agent: Optional[str] = None,
+               limit: Optional[int] = None) -> List[MemoryEntry]:
+        """Newest-first live entries for `release_id`."""
+        with self._lock:
+            ids = list(self._by_key.get(release_id, ()))
+            found = []
+            for doc_id in reversed(ids):
+                entry = self.get(doc_id)
+                if entry and (agent is None or entry.agent == agent):
+                    found.append(entry)
+                    if limit and len(found) >= limit:
+                        break
+            return found
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes,
+                    "max_bytes": self.max_bytes, "evictions": self.evictions,
+                    "sessions": len(self._by_key)}
+
+    def _remove(self, doc_id: str):
+        entry = self._entries.pop(doc_id, None)
+        if entry is None:
+            return
+        self.bytes -= entry.size
+        ids = self._by_key.get(entry.release_id)
+        if ids is not None:
+            ids.pop(doc_id, None)
+            if not ids:
+                del self._by_key[entry.release_id]
+
+    def _evict(self):
+        # Sweep expired entries (at most once a second; get() also checks
+        # expiry), then drop least recently used ones until we fit
+        now = time.time()
+        if now - self._last_sweep > 1.0:
+            self._last_sweep = now
+            for doc_id in [i for i, e in self._entries.items()
+                           if e.expires_at < now]:
+                self._remove(doc_id)
+                self.evictions += 1
+        while self.bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+
 class MemoryHub:
-    def __init__(self, persist_dir: str = "./chroma_db"):
+    """Two-tier agent memory: rush (in-process) in front of crash (Chroma).
+
+    Every save lands in the rush tier immediately. Important entries are
+    also spilled to the persistent Chroma store by a background thread, so
+    callers never wait on disk. Reads check rush first and fall through to
+    Chroma.
+
+    The crash tier is split into collections by `partition` (see
+    PartitionRouter). Reads scoped to one partition touch only its index;
+    unscoped ones fan out across all partitions and merge the results.
+
+    Vectors come from `embedder` (see make_embedder()) and are handed to
+    Chroma explicitly, so its implicit default embedding function is never
+    loaded.
+    """
+
+    def __init__(self, persist_dir: str = "./chroma_db",
+                 rush_ttl: float = RUSH_TTL_SECONDS,
+                 rush_max_bytes: int = RUSH_MAX_BYTES,
+                 embedder: Optional[Embedder] = None,
+                 partition: str = PARTITION_STRATEGY):
+        self.embedder = embedder or make_embedder()
+        self.embedder.load()
         self.client = chromadb.PersistentClient(path=persist_dir)
-        self.coll = self.client.get_or_create_collection("indii")
-
-    def save(self, agent: str, release_id: str, payload: Dict[str, Any]) -> str:
-        doc_id = str(uuid.uuid4())
-        self.coll.add(
-            documents=[json.dumps(payload)],
-            metadatas=[{"agent": agent, "release_id": release_id}],
-            ids=[doc_id]
-        )
-        return doc_id
+        self.router = PartitionRouter(partition)
+        self._collections: Dict[str, Any] = {}
+        self._collections_lock = threading.Lock()
+        self._fanout = ThreadPoolExecutor(max_workers=FANOUT_WORKERS,
+                                          thread_name_prefix="memory-fanout")
+        self.rush = RushMemory(ttl=rush_ttl, max_bytes=rush_max_bytes)
+        self._spill_queue: "queue.Queue[Optional[MemoryEntry]]" = queue.Queue()
+        self._spill_thread = threading.Thread(
+            target=self._spill_loop, name="memory-spill", daemon=True)
+        self._spill_thread.start()
+        atexit.register(self.close)
+        moved = self.repartition()
+        if moved:
+            logger.info("Moved %d memories from %r into %s partitions",
+                        moved, COLLECTION_NAME, self.router.strategy)
+
+    def save(self, agent: str, release_id: str, payload: Dict[str, Any],
+             important: bool = True) -> str:
+        with span("memory.save", agent=agent):
+            doc_id = str(uuid.uuid4())
+            entry = MemoryEntry(id=doc_id, agent=agent, release_id=release_id,
+                                payload=payload, document=json.dumps(payload),
+                                important=important)
+            self.rush.put(entry)
+            if important:
+                self._spill_queue.put(entry)
+            return doc_id
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.rush.get(doc_id)
+        if entry is not None:
+            return entry.to_dict()
+        for found in self._map(
+                lambda c: c.get(ids=[doc_id], include=["documents", "metadatas"]),
+                self._targets()):
+            if found["ids"]:
+                return self._from_crash(doc_id, found["documents"][0],
+                                        found["metadatas"][0])
+        return None
+
+    def recall(self, release_id: str, agent: Optional[str] = None,
+               limit: int = 10) -> List[Dict[str, Any]]:
+        """Newest-first memories for a session/release, rush tier first."""
+        found = [e.to_dict() for e in self.rush.recent(release_id, agent, limit)]
+        if len(found) >= limit:
+            return found
+        where = self._where(agent, release_id)
+        seen = {m["id"] for m in found}
+        need = limit - len(found)
+        older = []
+        for crash in self._map(lambda c: self._newest(c, where, need, seen),
+                               self._targets(agent, release_id)):
+            older.extend(crash)
+        older.sort(key=lambda m: m["created_at"], reverse=True)
+        return found + older[:need]
+
+    def upsert_documents(self, ids: List[str], documents: List[str],
+                         metadatas: List[Dict[str, Any]]):
+        """Write plain-text documents straight to the crash tier.
+
+        For bulk loads (e.g. knowledge-base chunks) that have no business in
+        the session tier; `ids` should be content-derived so re-runs are
+        idempotent. Each document is routed by its agent/release_id metadata.
+        """
+        if not ids:
+            return
+        self.upsert_records(ids, documents,
+                            [{**m, "format": "text"} for m in metadatas],
+                            self.embedder.embed(documents))
+
+    def upsert_records(self, ids: List[str], documents: List[str],
+                       metadatas: List[Dict[str, Any]], embeddings: np.ndarray):
+        """Write pre-embedded records, routing each to its partition."""
+        groups: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            name = self.router.route(meta.get("agent"), meta.get("release_id"))
+            groups.setdefault(name, []).append(i)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        for name, rows in groups.items():
+            self._collection(name).upsert(
+                ids=[ids[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                embeddings=embeddings[rows],
+                metadatas=[metadatas[i] for i in rows])
+
+    def delete(self, ids: List[str], agent: Optional[str] = None,
+               release_id: Optional[str] = None):
+        """Delete `ids`; pass agent/release_id to skip the partition fan-out."""
+        if ids:
+            self._map(lambda c: c.delete(ids=ids), self._targets(agent, release_id))
+
+    def query(self, text: str, n_results: int = 5,
+              where: Optional[Dict[str, Any]] = None,
+              agent: Optional[str] = None,
+              release_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Semantic search over the crash tier, nearest first.
+
+        `agent`/`release_id` both filter and route: a query confined to one
+        partition hits only that index, otherwise every partition is
+        searched in parallel and the hits merged by distance.
+        """
+        scoped = self._where(agent, release_id)
+        if where and scoped:
+            where = {"$and": [where, scoped]}
+        else:
+            where = where or scoped
+        embedding = self.embedder.embed([text])
+        hits = []
+        for found in self._map(
+                lambda c: c.query(query_embeddings=embedding, n_results=n_results,
+                                  where=where,
+                                  include=["documents", "metadatas", "distances"]),
+                self._targets(agent, release_id)):
+            hits.extend({**self._from_crash(i, d, m), "distance": dist}
+                        for i, d, m, dist in zip(found["ids"][0], found["documents"][0],
+                                                 found["metadatas"][0],
+                                                 found["distances"][0]))
+        hits.sort(key=lambda h: h["distance"])
+        return hits[:n_results]
+
+    def partitions(self) -> List[str]:
+        """Names of the crash-tier collections this hub's strategy owns."""
+        return sorted(c.name for c in self.client.list_collections()
+                      if self.router.owns(c.name))
+
+    def collection(self, name: str):
+        """The Chroma collection for partition `name` (for maintenance)."""
+        return self._collection(name)
+
+    def forget_collection(self, name: str):
+        """Drop the cached handle for `name` after it was replaced on disk."""
+        with self._collections_lock:
+            self._collections.pop(name, None)
+
+    def repartition(self, source: str = COLLECTION_NAME,
+                    batch_size: int = 500) -> int:
+        """Move every memory in collection `source` into its partition.
+
+        Runs on every hub start, so switching a store from "single" to a
+        partitioned strategy migrates it before anything reads it; once the
+        source is gone this is a no-op. Stored embeddings are reused, and a
+        hub in another process migrating the same store concurrently is
+        harmless. Returns the number moved.
+        """
+        if self.router.owns(source):
+            return 0
+        try:
+            src = self.client.get_collection(source, embedding_function=None)
+        except NotFoundError:
+            return 0
+        moved = 0
+        try:
+            while True:
+                batch = src.get(limit=batch_size,
+                                include=["documents", "metadatas", "embeddings"])
+                if not batch["ids"]:
+                    break
+                self.upsert_records(batch["ids"], batch["documents"],
+                                    batch["metadatas"], batch["embeddings"])
+                src.delete(ids=batch["ids"])
+                moved += len(batch["ids"])
+            self.client.delete_collection(source)
+        except NotFoundError:
+            pass  # another hub finished the migration first
+        return moved
+
+    def flush(self):
+        """Block until every queued spill has been written to Chroma."""
+        self._spill_queue.join()
+
+    def close(self):
+        if self._spill_thread.is_alive():
+            self._spill_queue.put(None)
+            self._spill_thread.join()
+        self._fanout.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rush": self.rush.stats(),
+                "pending_spills": self._spill_queue.qsize(),
+                "partition": self.router.strategy,
+                "partitions": len(self.partitions())}
+
+    def _collection(self, name: str):
+        with self._collections_lock:
+            coll = self._collections.get(name)
+            if coll is None:
+                coll = self.client.get_or_create_collection(
+                    name, embedding_function=None)
+                self._collections[name] = coll
+            return coll
+
+    def _targets(self, agent: Optional[str] = None,
+                 release_id: Optional[str] = None) -> List[Any]:
+        # Reads never create partitions: an unknown scope has nothing to read
+        name = self.router.scope(agent, release_id)
+        if name is not None and name in self._collections:
+            return [self._collections[name]]
+        names = self.partitions()
+        if name is not None:
+            names = [name] if name in names else []
+        return [self._collection(n) for n in names]
+
+    def _map(self, fn: Callable[[Any], Any], collections: List[Any]) -> List[Any]:
+        if len(collections) <= 1:
+            return [fn(c) for c in collections]
+        return list(self._fanout.map(fn, collections))
+
+    @staticmethod
+    def _where(agent: Optional[str],
+               release_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        clauses = [{k: v} for k, v in (("release_id", release_id), ("agent", agent))
+                   if v is not None]
+        if len(clauses) > 1:
+            return {"$and": clauses}
+        return clauses[0] if clauses else None
+
+    @staticmethod
+    def _and(*clauses: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # Flattens nested $and so Chroma sees one conjunction
+        flat: List[Dict[str, Any]] = []
+        for clause in clauses:
+            if clause:
+                flat.extend(clause["$and"] if "$and" in clause else [clause])
+        if len(flat) > 1:
+            return {"$and": flat}
+        return flat[0] if flat else None
+
+    @staticmethod
+    def _from_crash(doc_id: str, document: str,
+                    metadata: Dict[str, Any]) -> Dict[str, Any]:
+        if metadata.get("format") == "text":
+            payload = {"text": document}
+        else:
+            payload = json.loads(document)
+        return {"id": doc_id, "agent": metadata.get("agent"),
+                "release_id": metadata.get("release_id"),
+                "payload": payload,
+                "metadata": metadata,
+                "created_at": metadata.get("created_at", 0.0)}
+
+    def _newest(self, coll, where: Optional[Dict[str, Any]], need: int,
+                seen: set) -> List[Dict[str, Any]]:
+        """At least `need` of the newest matches in `coll` (or all of them).
+
+        Chroma cannot sort, so rather than pulling a release's whole history
+        this reads growing created_at windows backwards from now and stops
+        once it has enough, or nothing older is left. Memories written before
+        created_at existed cannot be windowed (Chroma has no missing-key
+        filter); they rank oldest and are paged in only if still short.
+        """
+        found: List[Dict[str, Any]] = []
+        upper = None
+        window = RECALL_WINDOW_SECONDS
+        lower = time.time() - window
+        while True:
+            bounds = [{"created_at": {"$gte": lower}}]
+            if upper is not None:
+                bounds.append({"created_at": {"$lt": upper}})
+            got = coll.get(where=self._and(where, *bounds),
+                           include=["documents", "metadatas"])
+            found.extend(self._from_crash(i, d, m) for i, d, m in
+                         zip(got["ids"], got["documents"], got["metadatas"])
+                         if i not in seen)
+            if len(found) >= need:
+                return found
+            older = coll.get(where=self._and(where, {"created_at": {"$lt": lower}}),
+                             limit=1, include=[])
+            if not older["ids"]:
+                return found + self._undated(coll, where, need - len(found), seen)
+            window *= RECALL_WINDOW_GROWTH
+            upper, lower = lower, lower - window
+
+    def _undated(self, coll, where: Optional[Dict[str, Any]], need: int,
+                 seen: set) -> List[Dict[str, Any]]:
+        """Up to `need` matches in `coll` that carry no created_at."""
+        found: List[Dict[str, Any]] = []
+        offset = 0
+        while len(found) < need:
+            got = coll.get(where=where, limit=RECALL_UNDATED_PAGE, offset=offset,
+                           include=["documents", "metadatas"])
+            found.extend(self._from_crash(i, d, m) for i, d, m in
+                         zip(got["ids"], got["documents"], got["metadatas"])
+                         if "created_at" not in m and i not in seen)
+            if len(got["ids"]) < RECALL_UNDATED_PAGE:
+                break
+            offset += RECALL_UNDATED_PAGE
+        return found[:need]
+
+    def _spill_loop(self):
+        stopping = False
+        while True:
+            if stopping:
+                # Drain what is left, including failed spills that were
+                # re-queued behind the shutdown sentinel
+                try:
+                    first = self._spill_queue.get_nowait()
+                except queue.Empty:
+                    return
+            else:
+                first = self._spill_queue.get()
+            batch = [first]
+            while len(batch) < SPILL_BATCH_SIZE:
+                try:
+                    batch.append(self._spill_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = stopping or None in batch
+            try:
+                self._spill([e for e in batch if e is not None])
+            finally:
+                for _ in batch:
+                    self._spill_queue.task_done()
+
+    def _spill(self, entries: List[MemoryEntry]):
+        groups: Dict[str, List[MemoryEntry]] = {}
+        for entry in entries:
+            groups.setdefault(self.router.route(entry.agent, entry.release_id),
+                              []).append(entry)
+        failed: List[MemoryEntry] = []
+        for name, group in groups.items():
+            try:
+                documents = [e.document for e in group]
+                self._collection(name).upsert(
+                    documents=documents,
+                    embeddings=self.embedder.embed(documents),
+                    metadatas=[e.metadata for e in group],
+                    ids=[e.id for e in group])
+            except Exception:
+                logger.exception("Spilling %d memories to %s failed",
+                                 len(group), name)
+                failed.extend(group)
+        if failed:
+            time.sleep(1)
+            for entry in failed:
+                entry.attempts += 1
+                if entry.attempts < SPILL_MAX_ATTEMPTS:
+                    self._spill_queue.put(entry)
@@ -0,0 +1,276 @@
+"""Retention, dedup and compaction for MemoryHub's Chroma store.
+
+One pass per partition:
+  * retention - drops memories older than their agent's TTL
+  * dedup     - keeps only the newest copy of identical payloads saved by
+                the same agent for the same release
+(memories saved before `created_at` was recorded are counted as
+"undated" and left alone by both)
+  * rebuild   - copies a partition whose HNSW index carries too many
+                deleted vectors into a fresh collection (Chroma never
+                shrinks an index in place)
+then removes index directories of dropped collections and VACUUMs
+chroma.sqlite3. Knowledge-base chunks (see knowledge_ingest.py) are left
+to their own manifest.
+
+Prints before/after disk size, document counts and query latency. Run it
+from cron while the server is stopped, e.g.
+
+    python memory_maintenance.py --persist-dir ./chroma_db --ttl user=30
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from memory_hub import PARTITION_STRATEGY, HashingEmbedder, MemoryHub
+
+RETENTION = os.environ.get("MEMORY_RETENTION", "")  # e.g. "user=30,*=365" (days)
+REBUILD_THRESHOLD = 0.2
+PAGE_SIZE = 1000
+LATENCY_PROBES = 20
+
+_SEGMENT_DIR = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+_COMPACTING = "compacting-"
+
+
+def parse_retention(spec: str) -> Dict[str, float]:
+    """Parse "agent=days,..." into {agent: seconds}; "*" is the default."""
+    policy = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        agent, _, days = item.partition("=")
+        if not days:
+            raise ValueError(f"Bad retention rule {item!r}; expected agent=days")
+        policy[agent.strip()] = float(days) * 86400
+    return policy
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f))
+               for root, _, files in os.walk(path) for f in files)
+
+
+class MemoryMaintenance:
+    """Runs retention, dedup and compaction over every partition of `hub`.
+
+    Rebuilding swaps collections underneath the hub, so only enable it
+    when nothing else is writing to the store.
+    """
+
+    def __init__(self, hub: MemoryHub, persist_dir: str,
+                 retention: Optional[Dict[str, float]] = None,
+                 dedup: bool = True, rebuild_threshold: float = REBUILD_THRESHOLD,
+                 dry_run: bool = False):
+        self.hub = hub
+        self.persist_dir = persist_dir
+        self.retention = retention or {}
+        self.dedup = dedup
+        self.rebuild_threshold = rebuild_threshold
+        self.dry_run = dry_run
+
+    def run(self) -> Dict[str, Any]:
+        recovery = self._recover()
+        probes = self._probes()
+        report = {"before": self._measure(probes), "partitions": {}}
+        if recovery:
+            report["recovery"] = recovery
+        for name in self.hub.partitions():
+            report["partitions"][name] = self._maintain(name)
+        if not self.dry_run:
+            report["orphan_dirs_removed"] = self._remove_orphans()
+            self._vacuum()
+        report["after"] = self._measure(probes)
+        return report
+
+    def _maintain(self, name: str) -> Dict[str, Any]:
+        coll = self.hub.collection(name)
+        now = time.time()
+        expired: List[str] = []
+        newest: Dict[tuple, tuple] = {}
+        duplicates: List[str] = []
+        undated = 0
+        total = 0
+        for offset in range(0, coll.count(), PAGE_SIZE):
+            page = coll.get(offset=offset, limit=PAGE_SIZE,
+                            include=["documents", "metadatas"])
+            for doc_id, doc, meta in zip(page["ids"], page["documents"],
+                                         page["metadatas"]):
+                total += 1
+                if meta.get("format") == "text":
+                    continue
+                agent = meta.get("agent")
+                created = meta.get("created_at")
+                if created is None:
+                    # Saved before memories were dated: age and recency are
+                    # unknown, so neither retention nor dedup may drop it
+                    undated += 1
+                    continue
+                ttl = self.retention.get(agent, self.retention.get("*"))
+                if ttl is not None and created < now - ttl:
+                    expired.append(doc_id)
+                    continue
+                if not self.dedup:
+                    continue
+                digest = meta.get("payload_hash") or hashlib.sha256(doc.encode()).hexdigest()
+                key = (agent, meta.get("release_id"), digest)
+                kept = newest.get(key)
+                if kept is None:
+                    newest[key] = (created, doc_id)
+                elif created > kept[0]:
+                    duplicates.append(kept[1])
+                    newest[key] = (created, doc_id)
+                else:
+                    duplicates.append(doc_id)
+
+        stats = {"documents": total, "expired": len(expired),
+                 "duplicates": len(duplicates), "undated": undated, "rebuilt": False}
+        doomed = expired + duplicates
+        if self.dry_run:
+            return stats
+        for i in range(0, len(doomed), PAGE_SIZE):
+            coll.delete(ids=doomed[i:i + PAGE_SIZE])
+        deleted_fraction = self._deleted_fraction(coll)
+        if self.rebuild_threshold is not None and deleted_fraction >= self.rebuild_threshold:
+            self._rebuild(name)
+            stats["rebuilt"] = True
+        stats["tombstone_fraction"] = round(deleted_fraction, 3)
+        return stats
+
+    def _deleted_fraction(self, coll) -> float:
+        # hnswlib never reclaims deleted slots; its length.bin holds one
+        # 4-byte entry per slot, live or deleted
+        db = sqlite3.connect(os.path.join(self.persist_dir, "chroma.sqlite3"))
+        try:
+            row = db.execute(
+                "SELECT id FROM segments WHERE collection = ? AND scope = 'VECTOR'",
+                (str(coll.id),)).fetchone()
+        finally:
+            db.close()
+        lengths = os.path.join(self.persist_dir, row[0], "length.bin") if row else ""
+        if not os.path.exists(lengths):
+            return 0.0  # still in Chroma's brute-force buffer
+        slots = os.path.getsize(lengths) // 4
+        return 0.0 if slots == 0 else max(0.0, 1 - coll.count() / slots)
+
+    def _rebuild(self, name: str):
+        client = self.hub.client
+        old = self.hub.collection(name)
+        tmp_name = _COMPACTING + hashlib.blake2b(name.encode(), digest_size=8).hexdigest()
+        tmp = client.get_or_create_collection(tmp_name, embedding_function=None,
+                                              metadata={"compacting": name})
+        for offset in range(0, old.count(), PAGE_SIZE):
+            page = old.get(offset=offset, limit=PAGE_SIZE,
+                           include=["documents", "metadatas", "embeddings"])
+            tmp.upsert(ids=page["ids"], documents=page["documents"],
+                       metadatas=page["metadatas"],
+                       embeddings=np.asarray(page["embeddings"]))
+        self._swap(tmp, name)
+
+    def _swap(self, tmp, name: str):
+        client = self.hub.client
+        self.hub.forget_collection(name)
+        if name in {c.name for c in client.list_collections()}:
+            client.delete_collection(name)
+        tmp.modify(name=name, metadata={"compacted_at": time.time()})
+
+    def _recover(self) -> List[Dict[str, str]]:
+        # A rebuild interrupted after dropping the original leaves the only
+        # copy in its temporary collection; otherwise the copy is stale.
+        # A dry run only reports what it would do.
+        actions = []
+        existing = {c.name: c for c in self.hub.client.list_collections()}
+        for tmp_name, tmp in existing.items():
+            if not tmp_name.startswith(_COMPACTING):
+                continue
+            original = (tmp.metadata or {}).get("compacting")
+            if original and original not in existing:
+                actions.append({"collection": tmp_name, "action": f"restore as {original}"})
+                if not self.dry_run:
+                    self._swap(tmp, original)
+            else:
+                actions.append({"collection": tmp_name, "action": "delete stale copy"})
+                if not self.dry_run:
+                    self.hub.client.delete_collection(tmp_name)
+        return actions
+
+    def _remove_orphans(self) -> int:
+        db = sqlite3.connect(os.path.join(self.persist_dir, "chroma.sqlite3"))
+        try:
+            live = {row[0] for row in db.execute("SELECT id FROM segments")}
+        finally:
+            db.close()
+        removed = 0
+        for entry in os.listdir(self.persist_dir):
+            path = os.path.join(self.persist_dir, entry)
+            if _SEGMENT_DIR.match(entry) and entry not in live and os.path.isdir(path):
+                shutil.rmtree(path)
+                removed += 1
+        return removed
+
+    def _vacuum(self):
+        db = sqlite3.connect(os.path.join(self.persist_dir, "chroma.sqlite3"))
+        try:
+            db.execute("VACUUM")
+        finally:
+            db.close()
+
+    def _probes(self) -> Dict[str, np.ndarray]:
+        # Stored vectors make embedder-free, repeatable latency probes
+        probes = {}
+        for name in self.hub.partitions():
+            got = self.hub.collection(name).get(limit=LATENCY_PROBES,
+                                                include=["embeddings"])
+            if len(got["ids"]):
+                probes[name] = np.asarray(got["embeddings"])
+        return probes
+
+    def _measure(self, probes: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        timings = []
+        for name, vectors in probes.items():
+            coll = self.hub.collection(name)
+            for vector in vectors:
+                started = time.perf_counter()
+                coll.query(query_embeddings=vector[None], n_results=5)
+                timings.append(time.perf_counter() - started)
+        counts = {n: self.hub.collection(n).count() for n in self.hub.partitions()}
+        ms = np.asarray(timings) * 1000
+        return {"bytes": dir_size(self.persist_dir),
+                "documents": sum(counts.values()),
+                "query_p50_ms": round(float(np.percentile(ms, 50)), 3) if len(ms) else None,
+                "query_p95_ms": round(float(np.percentile(ms, 95)), 3) if len(ms) else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--persist-dir", default="./chroma_db")
+    parser.add_argument("--partition", default=PARTITION_STRATEGY)
+    parser.add_argument("--ttl", action="append", default=[],
+                        help="agent=days retention rule; '*' sets the default")
+    parser.add_argument("--no-dedup", action="store_true")
+    parser.add_argument("--rebuild-threshold", type=float, default=REBUILD_THRESHOLD,
+                        help="rebuild partitions with at least this deleted fraction")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report what would be removed without changing anything")
+    args = parser.parse_args()
+
+    retention = parse_retention(",".join([RETENTION] + args.ttl))
+    # Maintenance reuses stored vectors, so the embedder is never called
+    hub = MemoryHub(args.persist_dir, embedder=HashingEmbedder(),
+                    partition=args.partition)
+    maintenance = MemoryMaintenance(hub, args.persist_dir, retention,
+                                    dedup=not args.no_dedup,
+                                    rebuild_threshold=args.rebuild_threshold,
+                                    dry_run=args.dry_run)
+    print(json.dumps(maintenance.run(), indent=2))
+    hub.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Streaming snapshot export/import for MemoryHub's crash tier.
+
+A snapshot is a directory of fixed-size chunks:
+
+    manifest.json      version, embedder, dim, chunk list, record count
+    00000.npy          float32 embeddings, shape (n, dim)
+    00000.jsonl        one {"id", "document", "metadata"} line per row
+
+Export pages through every partition and never holds more than one chunk
+in memory; import upserts chunk by chunk with the stored vectors, routing
+each record through the target hub's partitioning. Nothing is re-embedded,
+and both directions run against a live hub.
+
+Usage:
+    python memory_snapshot.py export ./snapshots/2024-06-01 [--persist-dir ./chroma_db]
+    python memory_snapshot.py import ./snapshots/2024-06-01 [--persist-dir ./chroma_db]
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from memory_hub import PARTITION_STRATEGY, MemoryHub, make_embedder
+
+SNAPSHOT_VERSION = 1
+CHUNK_RECORDS = 10000
+PAGE_SIZE = 1000
+
+
+class _ChunkWriter:
+    def __init__(self, path: str, chunk_records: int):
+        self.path = path
+        self.chunk_records = chunk_records
+        self.chunks: List[Dict[str, Any]] = []
+        self.records = 0
+        self.dim = None
+        self._rows: List[Dict[str, Any]] = []
+        self._vectors: List[np.ndarray] = []
+
+    def add(self, ids, documents, metadatas, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.dim = embeddings.shape[1] if len(embeddings) else self.dim
+        for i, doc_id in enumerate(ids):
+            self._rows.append({"id": doc_id, "document": documents[i],
+                               "metadata": metadatas[i]})
+            self._vectors.append(embeddings[i])
+            if len(self._rows) >= self.chunk_records:
+                self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        stem = f"{len(self.chunks):05d}"
+        np.save(os.path.join(self.path, stem + ".npy"), np.stack(self._vectors))
+        with open(os.path.join(self.path, stem + ".jsonl"), "w", encoding="utf-8") as f:
+            for row in self._rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.chunks.append({"name": stem, "records": len(self._rows)})
+        self.records += len(self._rows)
+        self._rows, self._vectors = [], []
+
+
+def export_snapshot(hub: MemoryHub, path: str,
+                    chunk_records: int = CHUNK_RECORDS) -> Dict[str, Any]:
+    """Write every crash-tier memory of `hub` to a new snapshot at `path`."""
+    if os.path.exists(path):
+        raise FileExistsError(f"Snapshot {path} already exists")
+    started = time.perf_counter()
+    hub.flush()  # include memories still waiting to spill
+    partial = path + ".partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    writer = _ChunkWriter(partial, chunk_records)
+    for name in hub.partitions():
+        coll = hub.collection(name)
+        offset = 0
+        while True:
+            page = coll.get(offset=offset, limit=PAGE_SIZE,
+                            include=["documents", "metadatas", "embeddings"])
+            if not page["ids"]:
+                break
+            writer.add(page["ids"], page["documents"], page["metadatas"],
+                       page["embeddings"])
+            offset += len(page["ids"])
+    writer.flush()
+    manifest = {"version": SNAPSHOT_VERSION, "created_at": time.time(),
+                "embedder": hub.embedder.name, "dim": writer.dim or hub.embedder.dim,
+                "partition": hub.router.strategy, "records": writer.records,
+                "chunks": writer.chunks}
+    with open(os.path.join(partial, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    # Only complete snapshots ever appear under `path`
+    os.rename(partial, path)
+    return {**manifest, "path": path,
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+def import_snapshot(hub: MemoryHub, path: str, batch_size: int = PAGE_SIZE,
+                    force: bool = False) -> Dict[str, Any]:
+    """Upsert every record of the snapshot at `path` into `hub`.
+
+    Refuses snapshots embedded by a different model unless `force`, since
+    their vectors would not be comparable with the hub's queries.
+    """
+    started = time.perf_counter()
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest.get('version')!r}")
+    if not force and (manifest["embedder"] != hub.embedder.name
+                      or manifest["dim"] != hub.embedder.dim):
+        raise ValueError(f"Snapshot was embedded with {manifest['embedder']} "
+                         f"({manifest['dim']}-d); this hub uses {hub.embedder.name} "
+                         f"({hub.embedder.dim}-d)")
+    imported = 0
+    for chunk in manifest["chunks"]:
+        vectors = np.load(os.path.join(path, chunk["name"] + ".npy"), mmap_mode="r")
+        with open(os.path.join(path, chunk["name"] + ".jsonl"), encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        if len(rows) != len(vectors):
+            raise ValueError(f"Snapshot chunk {chunk['name']} is corrupt")
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            hub.upsert_records([r["id"] for r in batch],
+                               [r["document"] for r in batch],
+                               [r["metadata"] for r in batch],
+                               np.asarray(vectors[i:i + batch_size]))
+            imported += len(batch)
+    return {"path": path, "records": imported,
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="snapshot directory")
+    parser.add_argument("--persist-dir", default="./chroma_db")
+    parser.add_argument("--partition", default=PARTITION_STRATEGY)
+    parser.add_argument("--embedder", default=None, help="onnx or hash")
+    parser.add_argument("--chunk-records", type=int, default=CHUNK_RECORDS)
+    parser.add_argument("--force", action="store_true",
+                        help="import even if the snapshot used another embedder")
+    args = parser.parse_args()
+
+    embedder = make_embedder(args.embedder) if args.embedder else None
+    hub = MemoryHub(args.persist_dir, embedder=embedder, partition=args.partition)
+    if args.command == "export":
+        result = export_snapshot(hub, args.path, args.chunk_records)
+    else:
+        result = import_snapshot(hub, args.path, force=args.force)
+    result.pop("chunks", None)
+    print(json.dumps(result, indent=2))
+    hub.close()
+
+
+if __name__ == "__main__":
+    main()
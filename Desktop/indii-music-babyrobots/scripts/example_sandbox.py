@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Persistent worker pool for running markdown Python examples.
+
+Each worker is a long-lived `python example_sandbox.py --worker` process
+that imports the mocks once, then executes examples sent to it as one
+JSON line per request on stdin, answering with one JSON line on stdout.
+Every example gets:
+
+- a fresh module namespace, fresh mock modules and its own temp working
+  directory (removed afterwards);
+- captured stdout/stderr (C-level output goes to /dev/null, so it cannot
+  corrupt the protocol);
+- a wall-clock timeout (an alarm inside the worker, with the parent
+  killing and replacing the worker if even that does not return);
+- resource limits on the worker (address space, file size) where the
+  platform supports them.
+
+Workers are recycled after `max_runs` examples so leaked state (threads,
+imported module globals) cannot build up.
+"""
+
+import builtins
+import io
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits
+    resource = None
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_RUNS = 50
+DEFAULT_MEMORY_LIMIT = 1024 * 1024 * 1024
+FILE_SIZE_LIMIT = 64 * 1024 * 1024
+KILL_GRACE = 2.0  # seconds past the timeout before the parent kills a worker
+MAX_OUTPUT = 4000
+MOCKED_MODULES = ['langchain', 'langgraph']
+MOCKED_SUBMODULES = ['document_loaders', 'text_splitter', 'tools']
+
+
+class MockModule:
+    def __getattr__(self, name):
+        return MockModule()
+    def __call__(self, *args, **kwargs):
+        return MockModule()
+
+
+class ExampleTimeout(BaseException):
+    """Raised in the worker when an example runs past its timeout."""
+
+
+def _install_mocks():
+    # Mock missing modules for syntax validation; fresh objects per example
+    for mod in MOCKED_MODULES:
+        if mod in sys.modules and not isinstance(sys.modules[mod], MockModule):
+            continue  # the real package is installed
+        sys.modules[mod] = MockModule()
+        for sub in MOCKED_SUBMODULES:
+            sys.modules[f"{mod}.{sub}"] = MockModule()
+
+
+def _apply_limits(memory_limit: int):
+    if resource is None:
+        return
+    for limit, value in ((resource.RLIMIT_AS, memory_limit),
+                         (resource.RLIMIT_FSIZE, FILE_SIZE_LIMIT)):
+        try:
+            _, hard = resource.getrlimit(limit)
+            if hard != resource.RLIM_INFINITY:
+                value = min(value, hard)
+            resource.setrlimit(limit, (value, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def _on_alarm(signum, frame):
+    raise ExampleTimeout()
+
+
+def run_example(code: str, section: str, timeout: float,
+                scratch: Optional[str] = None) -> Dict:
+    """Execute one example in a fresh namespace (inside a worker)."""
+    _install_mocks()
+    namespace = {"__name__": "__main__", "__builtins__": builtins}
+    output = io.StringIO()
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="example-", dir=scratch)
+    os.chdir(workdir)
+    has_alarm = hasattr(signal, "setitimer")
+    if has_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with redirect_stdout(output), redirect_stderr(output):
+            exec(compile(code, f"<example: {section}>", "exec"), namespace)
+        ok, message = True, ("✅ Code executed successfully (with mocked dependencies)\n"
+                             f"Section: {section}")
+    except ExampleTimeout:
+        ok, message = False, "Code execution timed out"
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+        message = "Example called sys.exit()" if ok else f"❌ Example exited with {e.code}"
+    except BaseException as e:
+        ok, message = False, f"❌ Runtime error: {str(e) or type(e).__name__}"
+    finally:
+        if has_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        namespace.clear()
+    return {"ok": ok, "message": message, "output": output.getvalue()[-MAX_OUTPUT:]}
+
+
+def worker_main(memory_limit: int, scratch: Optional[str] = None):
+    """Serve examples from stdin until it closes."""
+    protocol = os.fdopen(os.dup(1), "w", encoding="utf-8", buffering=1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    warnings.filterwarnings("ignore")
+    _apply_limits(memory_limit)
+    for line in sys.stdin:
+        request = json.loads(line)
+        response = run_example(request["code"], request["section"], request["timeout"],
+                               scratch)
+        protocol.write(json.dumps({"id": request["id"], **response}) + "\n")
+
+
+class _Worker:
+    def __init__(self, memory_limit: int):
+        # Owned by the parent, so even a killed worker leaves nothing behind
+        self.scratch = tempfile.mkdtemp(prefix="example-worker-")
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker",
+             "--memory-limit", str(memory_limit), "--scratch", self.scratch],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding="utf-8", bufsize=1)
+        self.responses: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self.runs = 0
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            self.responses.put(json.loads(line))
+        self.responses.put(None)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def run(self, request: Dict) -> Dict:
+        self.runs += 1
+        try:
+            self.proc.stdin.write(json.dumps(request) + "\n")
+            self.proc.stdin.flush()
+            response = self.responses.get(timeout=request["timeout"] + KILL_GRACE)
+        except queue.Empty:
+            self.kill()
+            return {"ok": False, "message": "Code execution timed out", "output": ""}
+        except (BrokenPipeError, OSError):
+            response = None
+        if response is None:
+            self.kill()
+            return {"ok": False, "output": "",
+                    "message": f"Worker died (exit code {self.proc.returncode}); "
+                               f"the example may have exceeded its resource limits"}
+        return response
+
+    def kill(self):
+        if self.alive:
+            self.proc.kill()
+        self.proc.wait()
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        self.kill()
+
+
+class ExamplePool:
+    """Runs examples concurrently on `workers` persistent sandboxed processes."""
+
+    def __init__(self, workers: int = os.cpu_count() or 1,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 max_runs: int = DEFAULT_MAX_RUNS,
+                 memory_limit: int = DEFAULT_MEMORY_LIMIT):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_runs = max_runs
+        self.memory_limit = memory_limit
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._all: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.recycled = 0
+
+    def run(self, examples: List[Tuple[str, str]]) -> List[Tuple[bool, str]]:
+        """Run (code, section) pairs; returns (success, message) in order."""
+        if not examples:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(examples))) as threads:
+            return list(threads.map(lambda e: self.run_one(*e), examples))
+
+    def run_one(self, code: str, section: str) -> Tuple[bool, str]:
+        worker = self._acquire()
+        with self._lock:
+            self._next_id += 1
+            request = {"id": self._next_id, "code": code, "section": section,
+                       "timeout": self.timeout}
+        try:
+            response = worker.run(request)
+        finally:
+            self._release(worker)
+        return response["ok"], response["message"]
+
+    def close(self):
+        with self._lock:
+            workers, self._all = self._all, []
+        for worker in workers:
+            worker.close()
+
+    def __enter__(self) -> "ExamplePool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _acquire(self) -> _Worker:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.workers:
+                worker = _Worker(self.memory_limit)
+                self._all.append(worker)
+                return worker
+        return self._idle.get()
+
+    def _release(self, worker: _Worker):
+        if worker.alive and worker.runs < self.max_runs:
+            self._idle.put(worker)
+            return
+        # Dead or worn out: replace it so state cannot leak further
+        worker.close()
+        with self._lock:
+            self._all.remove(worker)
+            self.recycled += 1
+            replacement = _Worker(self.memory_limit)
+            self._all.append(replacement)
+        self._idle.put(replacement)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--worker":
+        limit = DEFAULT_MEMORY_LIMIT
+        if "--memory-limit" in sys.argv:
+            limit = int(sys.argv[sys.argv.index("--memory-limit") + 1])
+        scratch = None
+        if "--scratch" in sys.argv:
+            scratch = sys.argv[sys.argv.index("--scratch") + 1]
+        worker_main(limit, scratch)
+    else:
+        print("Usage: example_sandbox.py --worker [--memory-limit BYTES] [--scratch DIR]")
+        sys.exit(2)
@@ -4,47 +4,23 @@ Generate interactive Jupyter notebooks from markdown documentation
 for hands-on exploration of RAG memory backend concepts.
 """
 
-import re
 import json
 from pathlib import Path
 from typing import List, Dict
 
+import markdown_sections
+
 def extract_sections_with_code(markdown_content: str) -> List[Dict]:
     """Extract sections with their explanations and code examples."""
-    sections = []
-    
-    # Split by main sections
-    section_pattern = r'### ✅ (\d+)\. ([^#]*?)(.*?)(?=### ✅|\n## |$)'
-    matches = re.findall(section_pattern, markdown_content, re.DOTALL)
-    
-    for number, title, content in matches:
-        # Extract code examples
-        code_pattern = r'#### 💡 EXAMPLE\s*\n\n```(\w+)\n(.*?)\n```'
-        code_matches = re.findall(code_pattern, content, re.DOTALL)
-        
-        # Extract TO DO items
-        todo_pattern = r'#### 📌 TO DO\s*\n\n((?:- ✅.*?\n)*)'
-        todo_match = re.search(todo_pattern, content, re.DOTALL)
-        todos = []
-        if todo_match:
-            todo_items = re.findall(r'- ✅ (.*)', todo_match.group(1))
-            todos = todo_items
-        
-        # Extract description
-        description_pattern = r'- \*\*Use\*\*: ([^-]*?)(?:\n-|\n#|$)'
-        desc_match = re.search(description_pattern, content)
-        description = desc_match.group(1).strip() if desc_match else ""
-        
-        sections.append({
-            'number': number,
-            'title': title.strip(),
-            'description': description,
-            'todos': todos,
-            'code_examples': code_matches,
-            'content': content
-        })
-    
-    return sections
+    return [{
+        'number': section.number,
+        'title': section.title,
+        'line': section.line,
+        'description': section.description,
+        'todos': section.todos,
+        'code_examples': [(block.language, block.code) for block in section.examples],
+        'content': section.content
+    } for section in markdown_sections.parse(markdown_content).sections]
 
 def generate_notebook_cells(sections: List[Dict]) -> List[Dict]:
     """Generate Jupyter notebook cells from extracted sections."""
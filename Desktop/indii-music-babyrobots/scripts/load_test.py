@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Load test for the chat + MCP tool stack.
+
+Boots main.py, tools/mastering_mcp.py and tools/art_mcp.py as local uvicorn
+subprocesses in a scratch directory (offline: hashing embedder, local art
+renderer), uploads synthetic WAVs of the given lengths at each concurrency
+level, and reports latency percentiles, throughput and per-service peak RSS.
+Results are also written as JSON so runs can be compared.
+
+Usage:
+    python scripts/load_test.py --concurrency 1,4,16 --requests 32 --sizes 10,60
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_RATE = 44100
+SERVICES = {
+    "main": "main:app",
+    "mastering": "tools.mastering_mcp:app",
+    "art": "tools.art_mcp:app",
+}
+
+
+def make_wav(seconds, seed=0):
+    """Stereo 16-bit WAV bytes: a few partials plus noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    signal = sum(rng.uniform(0.05, 0.2) * np.sin(2 * np.pi * rng.uniform(60, 2000) * t)
+                 for _ in range(4))
+    signal = signal + 0.02 * rng.standard_normal(len(t))
+    frames = np.repeat((np.clip(signal, -1, 1) * 32767).astype("<i2"), 2)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(frames.tobytes())
+    return buf.getvalue()
+
+
+def unique_variant(base, index):
+    """Same audio with the last samples changed, so caches see a new file."""
+    data = bytearray(base)
+    data[-8:] = index.to_bytes(8, "little")
+    return bytes(data)
+
+
+def process_tree(pid):
+    """pid plus all its descendants (Linux /proc)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        tree.append(p)
+        stack.extend(children.get(p, []))
+    return tree
+
+
+def rss_bytes(pid):
+    """Current resident set of a process tree, in bytes."""
+    total = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            pass
+    return total
+
+
+class RssSampler(threading.Thread):
+    """Tracks the peak RSS of each service's process tree."""
+
+    def __init__(self, pids, interval=0.2):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.peak = {name: 0 for name in pids}
+        self.enabled = os.path.isdir("/proc")
+        self._stop = threading.Event()
+
+    def reset(self):
+        self.peak = {name: 0 for name in self.pids}
+
+    def run(self):
+        while self.enabled and not self._stop.wait(self.interval):
+            for name, pid in self.pids.items():
+                self.peak[name] = max(self.peak[name], rss_bytes(pid))
+
+    def stop(self):
+        self._stop.set()
+
+
+def start_services(workdir, base_port, processes):
+    ports = {name: base_port + i for i, name in enumerate(SERVICES)}
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(PROJECT_ROOT),
+        "MEMORY_EMBEDDER": "hash",
+        "MEMORY_EMBEDDING_CACHE": str(workdir / "embedding_cache.db"),
+        "MASTERING_CACHE_DIR": str(workdir / "mastering_cache"),
+        "MASTERING_SCRATCH_DIR": str(workdir / "mastering_scratch"),
+        "MASTERING_PUBLIC_URL": f"http://127.0.0.1:{ports['mastering']}",
+        "MASTERING_PROCESSES": str(processes),
+        "ART_CACHE_PATH": str(workdir / "art_cache.db"),
+        "ART_STORE_DIR": str(workdir / "art_store"),
+        "ART_PUBLIC_URL": f"http://127.0.0.1:{ports['art']}",
+        "MCP_MASTERING_URLS": f"http://127.0.0.1:{ports['mastering']}",
+        "MCP_ART_URLS": f"http://127.0.0.1:{ports['art']}",
+        # Every request comes from one client; measure the stack, not the limiter
+        "ADMISSION_USER_RATE": "0",
+        "ADMISSION_MAX_INFLIGHT": "1024",
+    }
+    procs = {}
+    for name, app in SERVICES.items():
+        log = open(workdir / f"{name}.log", "w")
+        procs[name] = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--port", str(ports[name]),
+             "--log-level", "warning"],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    for name, port in ports.items():
+        while True:
+            if procs[name].poll() is not None:
+                raise RuntimeError(f"{name} exited; see {workdir / (name + '.log')}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{name} did not come up on port {port}")
+            time.sleep(0.2)
+    return procs, ports
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 4), "p95": round(float(p95), 4),
+            "p99": round(float(p99), 4)}
+
+
+async def one_request(client, url, body, index, stream):
+    started = time.perf_counter()
+    files = {"file": (f"load_{index}.wav", body, "audio/wav")}
+    data = {"message": f"load test cover {index % 8}"}
+    first_byte = None
+    if stream:
+        async with client.stream("POST", url, files=files, data=data) as r:
+            text = ""
+            async for chunk in r.aiter_text():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+                text += chunk
+        ok = r.status_code == 200 and "event: card" in text
+    else:
+        r = await client.post(url, files=files, data=data)
+        ok = r.status_code == 200 and "card" in r.json()
+    return ok, time.perf_counter() - started, first_byte
+
+
+async def run_level(port, concurrency, requests, base, offset, stream):
+    url = f"http://127.0.0.1:{port}/chat/stream" if stream else f"http://127.0.0.1:{port}/chat"
+    limit = asyncio.Semaphore(concurrency)
+    timeout = httpx.Timeout(600, connect=10)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def bounded(i):
+            async with limit:
+                try:
+                    return await one_request(client, url, unique_variant(base, offset + i),
+                                             offset + i, stream)
+                except httpx.HTTPError:
+                    return False, None, None
+        started = time.perf_counter()
+        results = await asyncio.gather(*(bounded(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+    ok = [r for r in results if r[0]]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": requests - len(ok),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3),
+        "latency_s": percentiles([r[1] for r in ok]),
+        "ttfb_s": percentiles([r[2] for r in ok if r[2] is not None]) if stream else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat + MCP stack")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="requests per level")
+    parser.add_argument("--sizes", default="10,60", help="WAV lengths in seconds")
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream (SSE)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="MASTERING_PROCESSES for the mastering server")
+    parser.add_argument("--base-port", type=int, default=18100)
+    parser.add_argument("--out", default="load_test_results.json")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    sizes = [float(s) for s in args.sizes.split(",")]
+
+    with tempfile.TemporaryDirectory(prefix="indii-load-") as tmp:
+        workdir = Path(tmp)
+        procs, ports = start_services(workdir, args.base_port, args.processes)
+        sampler = RssSampler({name: p.pid for name, p in procs.items()})
+        sampler.start()
+        runs = []
+        try:
+            offset = 0
+            for seconds in sizes:
+                base = make_wav(seconds)
+                for concurrency in levels:
+                    sampler.reset()
+                    run = asyncio.run(run_level(ports["main"], concurrency, args.requests,
+                                                base, offset, args.stream))
+                    offset += args.requests
+                    run["wav_seconds"] = seconds
+                    run["wav_bytes"] = len(base)
+                    run["peak_rss_mb"] = ({name: round(v / 2 ** 20, 1)
+                                           for name, v in sampler.peak.items()}
+                                          if sampler.enabled else None)
+                    runs.append(run)
+                    lat = run["latency_s"]
+                    print(f"{seconds:>6.0f}s wav  c={concurrency:<3} "
+                          f"ok={run['requests'] - run['errors']:<4} err={run['errors']:<3} "
+                          f"{run['throughput_rps']:>7.2f} req/s  "
+                          f"p50={lat['p50']}s p95={lat['p95']}s p99={lat['p99']}s  "
+                          f"rss={run['peak_rss_mb']}")
+        finally:
+            sampler.stop()
+            for p in procs.values():
+                p.terminate()
+            for p in procs.values():
+                try:
+                    p.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    p.kill()
+
+    results = {
+        "created_at": time.time(),
+        "host": {"python": platform.python_version(), "machine": platform.machine(),
+                 "cpus": os.cpu_count()},
+        "config": vars(args),
+        "runs": runs,
+    }
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
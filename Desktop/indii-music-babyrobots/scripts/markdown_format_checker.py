@@ -2,177 +2,206 @@
 """
 Comprehensive markdown format checker for the memory infrastructure plan.
 Validates structure, formatting, links, and common issues.
+
+The document is scanned once, line by line. The scanner
+(markdown_sections.scan_lines) tracks fenced code blocks (``` and ~~~) and
+YAML front matter, and each line is handed to every rule visitor; prose
+rules never see code, so checks no longer fire inside code blocks.
 """
 
 import re
 import sys
 from pathlib import Path
 
+from markdown_sections import scan_lines
+
+HEADER_PATTERN = re.compile(r'^(#{1,6})\s+(.+)$')
+INLINE_CODE_PATTERN = re.compile(r'`+[^`]*`+')
+LINK_PATTERN = re.compile(r'\[([^\]]+)\]\(([^)]*)\)')      # [text](url)
+AUTOLINK_PATTERN = re.compile(r'<([^>]+)>')                # <url>
+LIST_INDENT_PATTERN = re.compile(r'^ (?! )\s*[-*+] ')
+# A marker glued to its text: "-item", "+item", "*item" (but not *emphasis*)
+MISSING_SPACE_PATTERNS = (re.compile(r'^\s*-[^\s-]'), re.compile(r'^\s*\+[^\s+]'))
+STAR_ITEM_PATTERN = re.compile(r'^\s*\*([^\s*][^*]*)$')
+EMOJI_PATTERN = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\u2600-\u26FF\u2700-\u27BF]')
+EMOJI_HEADER_PATTERN = re.compile(r'^#+\s+[^\w]*\w')
+
+
+class Rule:
+    """Base rule visitor; subclasses collect issues as lines stream past."""
+
+    def __init__(self):
+        self.issues = []
+
+    def visit(self, number, line, stripped):
+        """A prose line (outside code blocks and front matter)."""
+
+    def visit_fence(self, number, opening, info):
+        """A code fence line; `info` is the opening fence's language tag."""
+
+    def finish(self, open_fence):
+        """End of document; `open_fence` is the unclosed fence's line, if any."""
+
+
+class HeadersRule(Rule):
+    def __init__(self):
+        super().__init__()
+        self.first_level = None
+        self.prev_level = 0
+
+    def visit(self, number, line, stripped):
+        if not line.startswith('#'):
+            return
+        match = HEADER_PATTERN.match(line)
+        if not match:
+            return
+        level = len(match.group(1))
+        if self.first_level is None:
+            self.first_level = level
+        if level > self.prev_level + 1:
+            self.issues.append(f"Line {number}: Header level jumps from {self.prev_level} to {level}")
+        self.prev_level = level
+
+    def finish(self, open_fence):
+        if self.first_level != 1:
+            self.issues.insert(0, "Document should start with a single H1 header")
+
+
+class CodeBlocksRule(Rule):
+    def visit_fence(self, number, opening, info):
+        if opening and not info:
+            self.issues.append(f"Line {number}: Code block without language specification")
+
+    def finish(self, open_fence):
+        if open_fence is not None:
+            self.issues.append(f"Line {open_fence}: Code block fence is never closed")
+
+
+class TablesRule(Rule):
+    def visit(self, number, line, stripped):
+        if stripped.startswith('|') and not stripped.endswith('|'):
+            self.issues.append(f"Line {number}: Table row should end with |")
+
+
+class LinksRule(Rule):
+    def visit(self, number, line, stripped):
+        if '](' not in line and '<' not in line:
+            return
+        prose = INLINE_CODE_PATTERN.sub('', line)
+        for text, url in LINK_PATTERN.findall(prose):
+            if not url.strip():
+                self.issues.append(f"Line {number}: Empty URL in link: [{text}]()")
+        for url in AUTOLINK_PATTERN.findall(prose):
+            if not url.strip():
+                self.issues.append(f"Line {number}: Empty URL in link: <{url}>")
+
+
+class ListsRule(Rule):
+    def visit(self, number, line, stripped):
+        # Skip horizontal rules
+        if stripped.startswith('---'):
+            return
+        # Check for inconsistent list markers
+        if LIST_INDENT_PATTERN.match(line):
+            self.issues.append(f"Line {number}: Inconsistent list indentation")
+        # Check for missing space after list marker
+        if (any(p.match(line) for p in MISSING_SPACE_PATTERNS)
+                or STAR_ITEM_PATTERN.match(line)):
+            self.issues.append(f"Line {number}: Missing space after list marker")
+
+
+class EmojiRule(Rule):
+    def visit(self, number, line, stripped):
+        # Check if emoji is used in headers appropriately
+        if (line.startswith('#') and EMOJI_PATTERN.search(line)
+                and not EMOJI_HEADER_PATTERN.match(line)):
+            self.issues.append(f"Line {number}: Header might have emoji formatting issues")
+
+
+CHECKS = [
+    ("Headers", HeadersRule),
+    ("Code Blocks", CodeBlocksRule),
+    ("Tables", TablesRule),
+    ("Links", LinksRule),
+    ("Lists", ListsRule),
+    ("Emoji Usage", EmojiRule),
+]
+
+
+def scan(lines, rules):
+    """Stream `lines` once through every rule visitor."""
+    open_fence = None     # line number of the open fence
+    for number, line, kind, info in scan_lines(lines):
+        if kind == "text":
+            stripped = line.strip()
+            for rule in rules:
+                rule.visit(number, line, stripped)
+        elif kind != "code":
+            open_fence = number if kind == "open" else None
+            for rule in rules:
+                rule.visit_fence(number, kind == "open", info)
+    for rule in rules:
+        rule.finish(open_fence)
+    return rules
+
+
+def _run(content, rule_class):
+    return scan(content.split('\n'), [rule_class()])[0].issues
+
 def check_headers(content):
     """Check header structure and hierarchy."""
-    issues = []
-    lines = content.split('\n')
-    
-    header_pattern = re.compile(r'^(#{1,6})\s+(.+)$')
-    headers = []
-    
-    for i, line in enumerate(lines, 1):
-        match = header_pattern.match(line)
-        if match:
-            level = len(match.group(1))
-            text = match.group(2)
-            headers.append((i, level, text))
-    
-    # Check for h1 at start
-    if not headers or headers[0][1] != 1:
-        issues.append("Document should start with a single H1 header")
-    
-    # Check header hierarchy
-    prev_level = 0
-    for line_num, level, text in headers:
-        if level > prev_level + 1:
-            issues.append(f"Line {line_num}: Header level jumps from {prev_level} to {level}")
-        prev_level = level
-    
-    return issues
+    return _run(content, HeadersRule)
 
 def check_code_blocks(content):
     """Check code block formatting."""
-    issues = []
-    
-    # Count opening and closing code fences
-    fence_count = content.count('```')
-    if fence_count % 2 != 0:
-        issues.append("Unmatched code block fences (``` count is odd)")
-    
-    # Check for proper language tags on opening fences only
-    lines = content.split('\n')
-    in_code_block = False
-    
-    for i, line in enumerate(lines, 1):
-        if line.strip().startswith('```'):
-            if not in_code_block:
-                # Opening fence - check for language
-                lang = line.strip()[3:].strip()
-                if not lang:
-                    issues.append(f"Line {i}: Code block without language specification")
-                in_code_block = True
-            else:
-                # Closing fence
-                in_code_block = False
-    
-    return issues
+    return _run(content, CodeBlocksRule)
 
 def check_tables(content):
     """Check table formatting."""
-    issues = []
-    lines = content.split('\n')
-    
-    in_table = False
-    table_start = 0
-    
-    for i, line in enumerate(lines):
-        if '|' in line and line.strip().startswith('|'):
-            if not in_table:
-                in_table = True
-                table_start = i + 1
-            
-            # Check pipe alignment
-            if not line.strip().endswith('|'):
-                issues.append(f"Line {i+1}: Table row should end with |")
-        elif in_table and line.strip() == '':
-            in_table = False
-        elif in_table and '|' not in line:
-            in_table = False
-    
-    return issues
+    return _run(content, TablesRule)
 
 def check_links(content):
     """Check link formatting."""
-    issues = []
-    
-    # Check for malformed links
-    link_patterns = [
-        r'\[([^\]]+)\]\(([^)]+)\)',  # [text](url)
-        r'<([^>]+)>',                # <url>
-    ]
-    
-    for pattern in link_patterns:
-        matches = re.findall(pattern, content)
-        for match in matches:
-            if isinstance(match, tuple):
-                text, url = match
-                if not url.strip():
-                    issues.append(f"Empty URL in link: [{text}]()")
-            else:
-                url = match
-                if not url.strip():
-                    issues.append(f"Empty URL in link: <{url}>")
-    
-    return issues
+    return _run(content, LinksRule)
 
 def check_lists(content):
     """Check list formatting."""
-    issues = []
-    lines = content.split('\n')
-    
-    for i, line in enumerate(lines, 1):
-        stripped = line.strip()
-        
-        # Skip horizontal rules
-        if stripped == '---' or stripped.startswith('---'):
-            continue
-        
-        # Check for inconsistent list markers
-        if stripped.startswith('- ') or stripped.startswith('* ') or stripped.startswith('+ '):
-            if line.startswith(' ') and not line.startswith('  '):
-                issues.append(f"Line {i}: Inconsistent list indentation")
-        
-        # Check for missing space after list marker (but not horizontal rules)
-        if re.match(r'^[\s]*[-*+][^\s]', line) and not re.match(r'^[\s]*---', line):
-            issues.append(f"Line {i}: Missing space after list marker")
-    
-    return issues
+    return _run(content, ListsRule)
 
 def check_emoji_usage(content):
     """Check emoji usage consistency."""
-    issues = []
-    
-    # Common emoji patterns in the document
-    emoji_pattern = r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\u2600-\u26FF\u2700-\u27BF]'
-    
-    lines = content.split('\n')
-    for i, line in enumerate(lines, 1):
-        if re.search(emoji_pattern, line):
-            # Check if emoji is used in headers appropriately
-            if line.startswith('#') and not re.match(r'^#+\s+[^\w]*\w', line):
-                issues.append(f"Line {i}: Header might have emoji formatting issues")
-    
-    return issues
+    return _run(content, EmojiRule)
+
+def check_lines(lines):
+    """Run all checks over an iterable of lines in one pass.
+
+    Returns {check name: [issues]} for every check.
+    """
+    rules = scan(lines, [rule_class() for _, rule_class in CHECKS])
+    return {check_name: rule.issues
+            for (check_name, _), rule in zip(CHECKS, rules)}
+
+def check_content(content):
+    """Run all checks on markdown text, without printing.
+
+    Returns {check name: [issues]} for every check.
+    """
+    return check_lines(content.split('\n'))
 
 def validate_markdown_file(file_path):
     """Run all validation checks on a markdown file."""
     with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
+        results = check_lines(f)
+
     print(f"🔍 Validating markdown format: {file_path}")
     print("=" * 60)
-    
+
     all_issues = []
-    
-    checks = [
-        ("Headers", check_headers),
-        ("Code Blocks", check_code_blocks),
-        ("Tables", check_tables),
-        ("Links", check_links),
-        ("Lists", check_lists),
-        ("Emoji Usage", check_emoji_usage),
-    ]
-    
-    for check_name, check_function in checks:
+
+    for check_name, _ in CHECKS:
         print(f"\n🔎 Checking {check_name}...")
-        issues = check_function(content)
-        
+        issues = results[check_name]
+
         if issues:
             print(f"  ❌ Found {len(issues)} issue(s):")
             for issue in issues:
@@ -180,7 +209,7 @@ def validate_markdown_file(file_path):
             all_issues.extend(issues)
         else:
             print(f"  ✅ {check_name} look good!")
-    
+
     return len(all_issues) == 0, all_issues
 
 def main():
@@ -189,13 +218,13 @@ def main():
         file_path = Path(sys.argv[1])
     else:
         file_path = Path("docs/memory_infra.md")
-    
+
     if not file_path.exists():
         print(f"Error: File {file_path} not found")
         sys.exit(1)
-    
+
     success, issues = validate_markdown_file(file_path)
-    
+
     print("\n" + "=" * 60)
     if success:
         print("🎉 All markdown formatting checks passed!")
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Single-pass structural parser for the plan-style markdown docs.
+
+Walks a document once, line by line, with scan_lines() tracking fenced
+code blocks and YAML front matter (so headings inside code are never
+mistaken for structure), and returns:
+
+- every fenced code block with its language and line number;
+- the numbered sections ("### ✅ 1. TITLE") with their description
+  ("- **Use**: ..."), TO DO items and "#### 💡 EXAMPLE" code blocks.
+
+Shared by generate_interactive_docs.py, validate_markdown_examples.py and
+test_markdown_examples.py so they all agree on what a section and an
+example are; markdown_format_checker.py runs its rules off scan_lines().
+
+Usage:
+    python scripts/markdown_sections.py docs/memory_infra.md   # print outline
+"""
+
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+FENCE_PATTERN = re.compile(r'^\s*(`{3,}|~{3,})\s*(.*)$')
+HEADER_PATTERN = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+SECTION_PATTERN = re.compile(r'^✅\s+(\d+)\.\s*(.*)$')
+EXAMPLE_HEADING_PATTERN = re.compile(r'^💡\s+EXAMPLE\b')
+TODO_HEADING_PATTERN = re.compile(r'^📌\s+TO DO\b')
+TODO_ITEM_PATTERN = re.compile(r'^\s*- ✅ (.*)$')
+USE_PATTERN = re.compile(r'^\s*- \*\*Use\*\*:\s*(.*)$')
+SECTION_LEVEL = 3
+
+
+@dataclass
+class CodeBlock:
+    language: str
+    code: str
+    line: int                       # line of the opening fence
+    heading: Optional[str] = None   # nearest heading above the block
+    section: Optional["Section"] = field(default=None, repr=False)
+
+    @property
+    def is_example(self) -> bool:
+        return bool(self.language and self.heading
+                    and EXAMPLE_HEADING_PATTERN.match(self.heading))
+
+
+@dataclass
+class Section:
+    number: str
+    title: str
+    line: int                       # line of the section heading
+    end_line: int = 0               # last line belonging to the section
+    description: str = ""
+    todos: List[str] = field(default_factory=list)
+    code_blocks: List[CodeBlock] = field(default_factory=list)
+    body: List[str] = field(default_factory=list, repr=False)
+
+    @property
+    def examples(self) -> List[CodeBlock]:
+        return [block for block in self.code_blocks if block.is_example]
+
+    @property
+    def content(self) -> str:
+        return "\n".join(self.body)
+
+
+@dataclass
+class Document:
+    sections: List[Section]
+    code_blocks: List[CodeBlock]
+
+    @property
+    def examples(self) -> List[CodeBlock]:
+        return [block for block in self.code_blocks if block.is_example]
+
+
+def scan_lines(lines: Iterable[str]) -> Iterator[Tuple[int, str, str, str]]:
+    """Yield (number, line, kind, info) for every line outside front matter.
+
+    `kind` is "open" or "close" for a code fence (`info` is the opening
+    fence's info string), "code" for lines inside a fence and "text" for
+    everything else. Line endings are stripped; numbers count from 1.
+    """
+    fence = None          # (char, length) of the open fence
+    front_matter = False
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if number == 1 and line == '---':
+            front_matter = True
+            continue
+        if front_matter:
+            if line in ('---', '...'):
+                front_matter = False
+            continue
+        match = FENCE_PATTERN.match(line) if ('`' in line or '~' in line) else None
+        if fence is not None:
+            if (match and match.group(1)[0] == fence[0]
+                    and len(match.group(1)) >= fence[1] and not match.group(2).strip()):
+                fence = None
+                yield number, line, "close", ""
+            else:
+                yield number, line, "code", ""
+        elif match and not (match.group(1)[0] == '`' and '`' in match.group(2)):
+            marker = match.group(1)
+            fence = (marker[0], len(marker))
+            yield number, line, "open", match.group(2).strip()
+        else:
+            yield number, line, "text", ""
+
+
+def parse(source: Union[str, Iterable[str]]) -> Document:
+    """Parse markdown text (or an iterable of lines) in one pass."""
+    lines = source.split('\n') if isinstance(source, str) else source
+    sections: List[Section] = []
+    blocks: List[CodeBlock] = []
+    section: Optional[Section] = None
+    heading: Optional[str] = None
+    fence = None          # (line number, language, code lines) of the open fence
+    number = 0
+    for number, line, kind, info in scan_lines(lines):
+        if section is not None:
+            section.body.append(line)
+        if kind == "code":
+            fence[2].append(line)
+            continue
+        if kind == "close":
+            block = CodeBlock(fence[1], "\n".join(fence[2]), fence[0], heading, section)
+            blocks.append(block)
+            if section is not None:
+                section.code_blocks.append(block)
+            fence = None
+            continue
+        if kind == "open":
+            fence = (number, info.split()[0] if info else "", [])
+            continue
+
+        header = HEADER_PATTERN.match(line) if line.startswith('#') else None
+        if header:
+            level, heading = len(header.group(1)), header.group(2)
+            numbered = SECTION_PATTERN.match(heading) if level == SECTION_LEVEL else None
+            if section is not None and (numbered or level < SECTION_LEVEL):
+                section.body.pop()
+                section.end_line = number - 1
+                section = None
+            if numbered:
+                section = Section(numbered.group(1), numbered.group(2).strip(), number)
+                sections.append(section)
+            continue
+        if section is None:
+            continue
+        if heading and TODO_HEADING_PATTERN.match(heading):
+            todo = TODO_ITEM_PATTERN.match(line)
+            if todo:
+                section.todos.append(todo.group(1).strip())
+        if not section.description:
+            use = USE_PATTERN.match(line)
+            if use:
+                section.description = use.group(1).strip()
+    if section is not None:
+        section.end_line = number
+    return Document(sections, blocks)
+
+
+def parse_file(file_path: Union[str, Path]) -> Document:
+    """Parse a markdown file, streaming its lines."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return parse(f)
+
+
+def main():
+    file_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("docs/memory_infra.md")
+    if not file_path.exists():
+        print(f"Error: File {file_path} not found")
+        sys.exit(1)
+    document = parse_file(file_path)
+    for section in document.sections:
+        print(f"{section.line:>5}-{section.end_line:<5} {section.number}. {section.title}")
+        for block in section.examples:
+            print(f"{block.line:>11}  💡 {block.language}")
+    print(f"\n{len(document.sections)} section(s), {len(document.code_blocks)} code "
+          f"block(s), {len(document.examples)} example(s)")
+
+
+if __name__ == "__main__":
+    main()
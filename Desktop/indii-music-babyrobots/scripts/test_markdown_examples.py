@@ -2,106 +2,49 @@
 """
 Enhanced markdown code validator that actually executes Python examples
 in isolated environments to verify they work end-to-end.
+
+Python examples run concurrently on a pool of persistent sandboxed
+workers (see example_sandbox.py), so interpreter startup and the mock
+setup are paid once per worker rather than once per example.
 """
 
-import re
 import json
-import ast
+import argparse
+import os
 import sys
-import tempfile
-import subprocess
+import time
 from pathlib import Path
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
+
+import markdown_sections
+from example_sandbox import DEFAULT_MAX_RUNS, DEFAULT_TIMEOUT, ExamplePool
 
 def extract_code_with_context(file_path: Path) -> List[Dict]:
     """Extract code blocks with surrounding context for better validation."""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Find code blocks with context
-    pattern = r'####\s+💡\s+EXAMPLE\s*\n\n```(\w+)\n(.*?)\n```'
-    matches = re.findall(pattern, content, re.DOTALL)
-    
     examples = []
-    for i, (language, code) in enumerate(matches):
-        # Extract the section title for context
-        section_pattern = rf'###\s+✅\s+\d+\.\s+([^#]*?).*?####\s+💡\s+EXAMPLE\s*\n\n```{language}\n{re.escape(code)}\n```'
-        section_match = re.search(section_pattern, content, re.DOTALL)
-        section_title = section_match.group(1).strip() if section_match else f"Example {i+1}"
-        
+    for i, block in enumerate(markdown_sections.parse_file(file_path).examples):
         examples.append({
-            'language': language,
-            'code': code,
-            'section': section_title,
+            'language': block.language,
+            'code': block.code,
+            'section': block.section.title if block.section else f"Example {i+1}",
+            'line': block.line,
             'index': i + 1
         })
     
     return examples
 
-def create_test_environment_for_python(code: str, section: str) -> Tuple[bool, str]:
-    """Create isolated test environment and run Python code."""
-    
-    # Create requirements based on imports
-    requirements = []
-    if 'langchain' in code:
-        requirements.extend(['langchain', 'langchain-community'])
-    if 'langgraph' in code:
-        requirements.append('langgraph')
-    
-    # Create test script that handles missing imports gracefully
-    test_script = f'''
-import sys
-import warnings
-warnings.filterwarnings("ignore")
-
-# Mock missing modules for syntax validation
-class MockModule:
-    def __getattr__(self, name):
-        return MockModule()
-    def __call__(self, *args, **kwargs):
-        return MockModule()
-
-missing_modules = ['langchain', 'langgraph']
-for mod in missing_modules:
-    if mod not in sys.modules:
-        sys.modules[mod] = MockModule()
-        sys.modules[mod + '.document_loaders'] = MockModule()
-        sys.modules[mod + '.text_splitter'] = MockModule()
-        sys.modules[mod + '.tools'] = MockModule()
+def create_test_environment_for_python(code: str, section: str,
+                                       pool: Optional[ExamplePool] = None) -> Tuple[bool, str]:
+    """Run Python code in a sandboxed worker (fresh namespace, mocked deps).
 
-try:
-    # Test the actual code
-{chr(10).join("    " + line for line in code.split(chr(10)))}
-    
-    print("✅ Code executed successfully (with mocked dependencies)")
-    print("Section: {section}")
-    
-except Exception as e:
-    print("❌ Runtime error:", str(e))
-    sys.exit(1)
-'''
-    
+    Pass a shared `pool` when testing many examples; without one a
+    single-use worker is started for this call.
+    """
     try:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(test_script)
-            temp_file = f.name
-        
-        result = subprocess.run(
-            [sys.executable, temp_file],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        Path(temp_file).unlink()  # cleanup
-        
-        if result.returncode == 0:
-            return True, result.stdout.strip()
-        else:
-            return False, result.stderr.strip()
-            
-    except subprocess.TimeoutExpired:
-        return False, "Code execution timed out"
+        if pool is not None:
+            return pool.run_one(code, section)
+        with ExamplePool(workers=1) as single:
+            return single.run_one(code, section)
     except Exception as e:
         return False, f"Test environment error: {e}"
 
@@ -128,7 +71,16 @@ def validate_json_with_schema(code: str, section: str) -> Tuple[bool, str]:
 
 def main():
     """Enhanced validation with executable testing."""
-    file_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("docs/memory_infra.md")
+    parser = argparse.ArgumentParser(description="Execute markdown code examples")
+    parser.add_argument("file", nargs="?", default="docs/memory_infra.md")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="sandboxed worker processes")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds allowed per example")
+    parser.add_argument("--max-runs", type=int, default=DEFAULT_MAX_RUNS,
+                        help="examples a worker runs before it is recycled")
+    args = parser.parse_args()
+    file_path = Path(args.file)
     
     if not file_path.exists():
         print(f"Error: File {file_path} not found")
@@ -144,18 +96,23 @@ def main():
         print("No code examples found")
         return
     
+    started = time.perf_counter()
+    python_examples = [e for e in examples if e['language'] == 'python']
+    with ExamplePool(workers=args.workers, timeout=args.timeout,
+                     max_runs=args.max_runs) as pool:
+        python_results = pool.run([(e['code'], e['section']) for e in python_examples])
+    for example, result in zip(python_examples, python_results):
+        example['result'] = result
+    
     all_passed = True
     
     for example in examples:
         print(f"\n🔍 Testing: {example['section']}")
-        print(f"Language: {example['language']}")
+        print(f"Language: {example['language']} (line {example['line']})")
         print("-" * 40)
         
         if example['language'] == 'python':
-            success, message = create_test_environment_for_python(
-                example['code'], 
-                example['section']
-            )
+            success, message = example['result']
         elif example['language'] == 'json':
             success, message = validate_json_with_schema(
                 example['code'],
@@ -173,6 +130,7 @@ def main():
             print(f"Code preview:\n{example['code'][:150]}...")
     
     print("\n" + "=" * 60)
+    print(f"Tested {len(examples)} example(s) in {time.perf_counter() - started:.2f}s")
     if all_passed:
         print("🎉 All enhanced validations passed!")
     else:
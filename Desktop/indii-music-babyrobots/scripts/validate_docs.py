@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Tree-wide markdown validation.
+
+Runs the code-example validator (validate_markdown_examples.py) and the
+format checker (markdown_format_checker.py) over every markdown file in
+the repository root and docs/ (or the given files/directories). Files
+are checked in parallel on a process pool, and results are cached by
+content hash, so only files that changed since the last run (or whose
+checker code changed) are checked again. A consolidated JSON report is
+written for CI and other tools.
+
+Usage:
+    python scripts/validate_docs.py                 # repo root + docs/
+    python scripts/validate_docs.py docs README.md --jobs 4
+    python scripts/validate_docs.py --no-cache --report report.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import markdown_format_checker
+import markdown_sections
+import validate_markdown_examples
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SKIP_DIRS = {"node_modules", ".git", ".next", "build", "dist", "target", "__pycache__"}
+DEFAULT_CACHE = PROJECT_ROOT / ".docs_validation_cache.json"
+DEFAULT_REPORT = PROJECT_ROOT / "docs_validation_report.json"
+
+
+def checker_version():
+    """Hash of the checker sources; editing a rule invalidates the cache."""
+    digest = hashlib.sha256()
+    for module in (markdown_format_checker, markdown_sections, validate_markdown_examples):
+        digest.update(Path(module.__file__).read_bytes())
+    return digest.hexdigest()
+
+
+def find_markdown_files(paths):
+    """Markdown files under `paths` (files or directories), sorted."""
+    found = set()
+    for path in paths:
+        path = Path(path)
+        if path.is_file():
+            found.add(path.resolve())
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            found.update(Path(root, f).resolve() for f in files if f.endswith(".md"))
+    return sorted(found)
+
+
+def default_paths():
+    """Top-level markdown files plus everything under docs/."""
+    return sorted(PROJECT_ROOT.glob("*.md")) + [PROJECT_ROOT / "docs"]
+
+
+def check_text(content):
+    """Both checkers' results for one file's text (runs in a worker)."""
+    format_issues = markdown_format_checker.check_content(content)
+    blocks = validate_markdown_examples.validate_content(content)
+    failed_blocks = [b for b in blocks if not b["valid"]]
+    return {
+        "passed": not failed_blocks and not any(format_issues.values()),
+        "format_issues": {name: issues for name, issues in format_issues.items() if issues},
+        "code_blocks": {"total": len(blocks), "failed": failed_blocks},
+    }
+
+
+def load_cache(path, version):
+    try:
+        with open(path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get("results", {}) if cache.get("version") == version else {}
+
+
+def save_cache(path, version, results):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "results": results}, f)
+    os.replace(tmp, path)
+
+
+def display_path(path):
+    try:
+        return str(path.relative_to(PROJECT_ROOT))
+    except ValueError:
+        return str(path)
+
+
+def validate_tree(files, jobs, cache_path=None):
+    """Check `files`, reusing cached results for unchanged content."""
+    version = checker_version()
+    cached = load_cache(cache_path, version) if cache_path else {}
+    texts, digests = {}, {}
+    for path in files:
+        text = path.read_text(encoding="utf-8", errors="replace")
+        digests[path] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if digests[path] not in cached:
+            texts[path] = text
+
+    # Identical files are only checked once
+    pending = {}
+    for path, text in texts.items():
+        pending.setdefault(digests[path], text)
+    fresh = {}
+    if len(pending) > 1 and jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+            for digest, result in zip(pending, pool.map(check_text, pending.values(),
+                                                        chunksize=4)):
+                fresh[digest] = result
+    else:
+        fresh = {digest: check_text(text) for digest, text in pending.items()}
+
+    report = []
+    for path in files:
+        digest = digests[path]
+        result = fresh.get(digest) or cached[digest]
+        report.append({"path": display_path(path), "sha256": digest,
+                       "cached": digest not in fresh, **result})
+    if cache_path:
+        # Keep only entries for files that still exist in this form
+        save_cache(cache_path, version,
+                   {d: fresh.get(d) or cached[d] for d in set(digests.values())})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate markdown files across the repo")
+    parser.add_argument("paths", nargs="*", help="files or directories (default: root + docs/)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes")
+    parser.add_argument("--cache", default=str(DEFAULT_CACHE), help="result cache file")
+    parser.add_argument("--no-cache", action="store_true", help="check every file")
+    parser.add_argument("--report", default=str(DEFAULT_REPORT), help="JSON report path")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    files = find_markdown_files(args.paths or default_paths())
+    if not files:
+        print("No markdown files found")
+        sys.exit(1)
+    results = validate_tree(files, args.jobs, None if args.no_cache else args.cache)
+    failed = [r for r in results if not r["passed"]]
+    summary = {
+        "files": len(results),
+        "passed": len(results) - len(failed),
+        "failed": len(failed),
+        "cached": sum(1 for r in results if r["cached"]),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump({"generated_at": time.time(), "summary": summary, "files": results},
+                  f, indent=2, ensure_ascii=False)
+
+    for r in failed:
+        issues = sum(len(i) for i in r["format_issues"].values())
+        print(f"❌ {r['path']}: {issues} format issue(s), "
+              f"{len(r['code_blocks']['failed'])} invalid code block(s)")
+    print(f"\n{summary['passed']}/{summary['files']} files passed "
+          f"({summary['cached']} from cache) in {summary['seconds']}s; "
+          f"report written to {args.report}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,16 +10,22 @@ import ast
 import sys
 from pathlib import Path
 
+import markdown_sections
+
+LANGUAGE_PATTERN = re.compile(r'^\w+$')
+
+def _with_language(blocks):
+    return [block for block in blocks if LANGUAGE_PATTERN.match(block.language)]
+
 def extract_code_blocks(file_path):
     """Extract all code blocks from a markdown file."""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Find all code blocks with language specifiers
-    pattern = r'```(\w+)\n(.*?)\n```'
-    matches = re.findall(pattern, content, re.DOTALL)
-    
-    return matches
+    return [(block.language, block.code)
+            for block in _with_language(markdown_sections.parse_file(file_path).code_blocks)]
+
+def find_code_block_records(content):
+    """Find all code blocks with language specifiers in markdown text, as
+    markdown_sections.CodeBlock records (with line numbers)."""
+    return _with_language(markdown_sections.parse(content).code_blocks)
 
 def validate_python_code(code):
     """Validate Python code syntax."""
@@ -48,6 +54,29 @@ def validate_cypher_code(code):
     else:
         return False, "No Cypher keywords found"
 
+def validate_code_block(language, code):
+    """Validate one code block; returns (valid, message)."""
+    if language.lower() == 'python':
+        return validate_python_code(code)
+    elif language.lower() == 'json':
+        return validate_json_code(code)
+    elif language.lower() == 'cypher':
+        return validate_cypher_code(code)
+    else:
+        return True, f"Skipping validation for {language}"
+
+def validate_content(content):
+    """Validate every code block in markdown text, without printing.
+    
+    Returns one dict per block: block number, line, language, valid, message.
+    """
+    results = []
+    for i, block in enumerate(find_code_block_records(content), 1):
+        valid, message = validate_code_block(block.language, block.code)
+        results.append({"block": i, "line": block.line, "language": block.language,
+                        "valid": valid, "message": message})
+    return results
+
 def validate_markdown_file(file_path):
     """Validate all code examples in a markdown file."""
     print(f"\nValidating: {file_path}")
@@ -65,14 +94,7 @@ def validate_markdown_file(file_path):
         print(f"\nCode block {i} ({language}):")
         print("-" * 30)
         
-        if language.lower() == 'python':
-            valid, message = validate_python_code(code)
-        elif language.lower() == 'json':
-            valid, message = validate_json_code(code)
-        elif language.lower() == 'cypher':
-            valid, message = validate_cypher_code(code)
-        else:
-            valid, message = True, f"Skipping validation for {language}"
+        valid, message = validate_code_block(language, code)
         
         status = "✅ PASS" if valid else "❌ FAIL"
         print(f"{status}: {message}")
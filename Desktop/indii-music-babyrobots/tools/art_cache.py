@@ -0,0 +1,109 @@
+# tools/art_cache.py
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, Unicode forms and whitespace so equivalent prompts match."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", prompt)).strip().casefold()
+
+
+def prompt_key(prompt: str, params: Dict[str, Any]) -> str:
+    """Stable (cross-process) key for a prompt plus generation parameters."""
+    blob = json.dumps({"prompt": normalize_prompt(prompt), "params": params},
+                      sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ArtCache:
+    """SQLite-backed store of generation results that expire after `ttl`."""
+
+    def __init__(self, path: str = "./art_cache.db", ttl: float = 7 * 86400):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL,"
+            " created_at REAL NOT NULL, expires_at REAL NOT NULL)")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS results_expiry ON results(expires_at)")
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, expires_at FROM results WHERE key = ?",
+                (key,)).fetchone()
+            if row and row[1] > time.time():
+                self.hits += 1
+                return json.loads(row[0])
+            if row:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+            self.misses += 1
+            return None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result), now, now + self.ttl))
+            self._db.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM results WHERE expires_at <= ?",
+                (time.time(),)).rowcount
+            self._db.commit()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._db.execute(
+                "SELECT COUNT(*) FROM results").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "ttl_seconds": self.ttl,
+        }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution.
+
+    The first caller's coroutine runs as its own task, so a disconnecting
+    client cancels only its own wait, never the shared call.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
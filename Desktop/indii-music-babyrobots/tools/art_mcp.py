@@ -1,31 +1,88 @@
-import uvicorn
-from fastapi import FastAPI, Request
-import httpx
+"""Art-MCP service.
+
+Its imports are rooted at the project root (``tools.*``, ``tracing``), so
+run it from there as a module rather than as a script:
+
+    python -m uvicorn tools.art_mcp:app --host 0.0.0.0 --port 8002
+"""
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from tools.art_cache import ArtCache, SingleFlight, prompt_key
+from tools.art_render import ArtStore, render_derivatives
+from tracing import install as install_tracing, span
+
+ART_CACHE_PATH = os.environ.get("ART_CACHE_PATH", "./art_cache.db")
+ART_CACHE_TTL_SECONDS = float(os.environ.get("ART_CACHE_TTL_SECONDS", str(7 * 86400)))
+ART_STORE_DIR = os.environ.get("ART_STORE_DIR", "./art_store")
+ART_ENCODE_WORKERS = int(os.environ.get("ART_ENCODE_WORKERS", str(os.cpu_count() or 1)))
+ART_PUBLIC_URL = os.environ.get("ART_PUBLIC_URL", "http://localhost:8002")
+
+cache = ArtCache(ART_CACHE_PATH, ttl=ART_CACHE_TTL_SECONDS)
+flights = SingleFlight()
+store = ArtStore(ART_STORE_DIR)
+# Derivative resize/encode fans out here; rendering itself runs on the
+# default threadpool so it never waits on its own workers
+encoders = ThreadPoolExecutor(max_workers=ART_ENCODE_WORKERS,
+                              thread_name_prefix="art-encode")
 
 app = FastAPI(title="Art-MCP")
+install_tracing(app, "art-mcp")
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "service": "art-mcp"}
+    return {"status": "ok", "service": "art-mcp", "inflight": flights.inflight}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {**cache.stats(), "coalesced": flights.coalesced,
+            "store": store.stats()}
+
+@app.get("/covers/{name}")
+def cover_file(name: str):
+    path = store.find(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown cover")
+    media_type = "image/webp" if name.endswith(".webp") else "image/jpeg"
+    return FileResponse(path, media_type=media_type)
+
+async def generate_cover(key: str, prompt: str, params: dict) -> dict:
+    # In production, replace with actual AI art service
+    # async with httpx.AsyncClient(timeout=60) as client:
+    #     r = await client.post("https://api.example.com/art",
+    #                           json={"prompt": prompt, **params})
+    #     r.raise_for_status()
+    #     cover_url = r.json()["cover_url"]
+
+    # Local deterministic stand-in: procedural art seeded by the prompt key
+    with span("art.render"):
+        derivatives = await run_in_threadpool(render_derivatives, key, store, encoders)
+    for d in derivatives:
+        d["url"] = f"{ART_PUBLIC_URL}/covers/{d['name']}"
+    cover_url = derivatives[0]["url"]
+
+    result = {"cover_url": cover_url, "derivatives": derivatives}
+    await run_in_threadpool(cache.put, key, result)
+    return result
 
 @app.post("/art")
 async def art(request: Request):
     try:
         data = await request.json()
         prompt = data["prompt"]
-        
-        # For demo purposes, return a mock cover URL
-        # In production, replace with actual AI art service
-        # r = httpx.post("https://api.example.com/art", json={"prompt": prompt})
-        # r.raise_for_status()
-        # cover_url = r.json()["cover_url"]
-        
-        # Mock response for demo
-        cover_url = f"https://demo-storage.com/covers/{hash(prompt)}.jpg"
-        
-        return {"cover_url": cover_url}
+        # Everything except the prompt and bookkeeping shapes the image
+        params = {k: v for k, v in data.items() if k not in ("prompt", "release_id")}
+        key = prompt_key(prompt, params)
+
+        with span("art.cache_lookup"):
+            cached = await run_in_threadpool(cache.get, key)
+        if cached is not None:
+            return {**cached, "cached": True}
+        # Identical prompts already being generated share that one call
+        result = await flights.do(key, lambda: generate_cover(key, prompt, params))
+        return {**result, "cached": False}
     except Exception as e:
         return {"error": f"Art generation failed: {str(e)}"}
-
-if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8002)
@@ -0,0 +1,121 @@
+# tools/art_render.py
+"""Deterministic local cover renderer and derivative pipeline.
+
+Stands in for the image-generation backend: the prompt key seeds a
+procedural artwork (gradient, interference waves and soft discs) rendered
+with NumPy, so the same prompt always yields the same pixels. Every cover
+is then resized and encoded to the configured sizes and formats on a
+thread pool and stored content-addressed on local disk.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+MASTER_SIZE = 3000  # distributor cover-art spec
+DERIVATIVES: List[Tuple[int, str]] = [
+    (3000, "jpeg"), (1400, "jpeg"), (640, "webp"), (640, "jpeg"), (300, "webp"),
+]
+_EXT = {"jpeg": ".jpg", "webp": ".webp"}
+_ENCODE = {"jpeg": {"quality": 90, "optimize": True, "progressive": True},
+           "webp": {"quality": 85, "method": 4}}
+_RENDER_SIZE = 1000  # procedural detail is smooth; upsample to MASTER_SIZE
+
+
+def render_cover(key: str, size: int = MASTER_SIZE) -> Image.Image:
+    """Render the cover for prompt key `key` (hex) as a size x size RGB image."""
+    rng = np.random.default_rng(int(key[:16], 16))
+    n = min(size, _RENDER_SIZE)
+    y, x = np.mgrid[0:n, 0:n].astype(np.float32) / n
+
+    palette = rng.uniform(0, 1, (3, 3)).astype(np.float32)
+    angle = rng.uniform(0, 2 * np.pi)
+    t = np.clip(0.5 + (x - 0.5) * np.cos(angle) + (y - 0.5) * np.sin(angle), 0, 1)
+    img = (palette[0] * (1 - t)[..., None] + palette[1] * t[..., None])
+
+    waves = np.zeros_like(x)
+    for _ in range(rng.integers(2, 5)):
+        fx, fy = rng.uniform(2, 14, 2)
+        waves += np.sin(2 * np.pi * (fx * x + fy * y) + rng.uniform(0, 2 * np.pi))
+    img += 0.12 * (waves / 4)[..., None] * palette[2]
+
+    for _ in range(rng.integers(3, 8)):
+        cx, cy, r = rng.uniform(0.1, 0.9), rng.uniform(0.1, 0.9), rng.uniform(0.05, 0.3)
+        disc = np.clip(1 - np.hypot(x - cx, y - cy) / r, 0, 1) ** 2
+        img = img * (1 - 0.6 * disc[..., None]) + 0.6 * disc[..., None] * rng.uniform(0, 1, 3)
+
+    image = Image.fromarray((np.clip(img, 0, 1) * 255).astype(np.uint8), "RGB")
+    if n != size:
+        image = image.resize((size, size), Image.BICUBIC)
+    return image
+
+
+class ArtStore:
+    """Content-addressed blob store: objects/<sha[:2]>/<sha><ext>."""
+
+    def __init__(self, root: str = "./art_store"):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def path_for(self, digest: str, ext: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest + ext)
+
+    def put(self, data: bytes, ext: str) -> str:
+        """Store `data` (once) and return its SHA-256."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest, ext)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def find(self, name: str) -> Optional[str]:
+        """Resolve "<sha><ext>" to a stored path, or None."""
+        digest, ext = os.path.splitext(os.path.basename(name))
+        if len(digest) != 64 or ext not in _EXT.values():
+            return None
+        path = self.path_for(digest, ext)
+        return path if os.path.exists(path) else None
+
+    def stats(self) -> Dict[str, Any]:
+        objects = size = 0
+        for root, _, files in os.walk(self.objects_dir):
+            for f in files:
+                objects += 1
+                size += os.path.getsize(os.path.join(root, f))
+        return {"objects": objects, "bytes": size}
+
+
+def _derive(master: Image.Image, size: int, fmt: str, store: ArtStore) -> Dict[str, Any]:
+    image = master if size == master.width else master.resize((size, size), Image.LANCZOS)
+    buf = io.BytesIO()
+    image.save(buf, format=fmt.upper(), **_ENCODE[fmt])
+    data = buf.getvalue()
+    digest = store.put(data, _EXT[fmt])
+    return {"size": size, "format": fmt, "name": digest + _EXT[fmt],
+            "bytes": len(data)}
+
+
+def render_derivatives(key: str, store: ArtStore,
+                       executor: Optional[Executor] = None,
+                       derivatives: List[Tuple[int, str]] = DERIVATIVES) -> List[Dict[str, Any]]:
+    """Render the cover for `key` and store every (size, format) derivative.
+
+    Resizing and encoding run on `executor` when given (Pillow releases the
+    GIL for both). Returns one record per derivative, in `derivatives` order.
+    """
+    master = render_cover(key, max(size for size, _ in derivatives))
+    if executor is None:
+        return [_derive(master, size, fmt, store) for size, fmt in derivatives]
+    futures = [executor.submit(_derive, master, size, fmt, store)
+               for size, fmt in derivatives]
+    return [f.result() for f in futures]
@@ -0,0 +1,189 @@
+# tools/audio_io.py
+"""Memory-mapped WAV I/O shared by the mastering tools.
+
+Sample data is exposed as `numpy.memmap` views shaped (frames, channels);
+slicing a frame range or a channel returns another view, never a copy, so
+analysis stages can walk a multi-GB stem in constant memory.
+"""
+import os
+import struct
+from dataclasses import dataclass
+from typing import Iterator, Tuple
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+_SAMPLE_FORMATS = {
+    (WAVE_FORMAT_PCM, 8): np.dtype("u1"),
+    (WAVE_FORMAT_PCM, 16): np.dtype("<i2"),
+    (WAVE_FORMAT_PCM, 24): np.dtype(("u1", 3)),  # packed; see to_float()
+    (WAVE_FORMAT_PCM, 32): np.dtype("<i4"),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype("<f4"),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype("<f8"),
+}
+
+
+@dataclass(frozen=True)
+class WavInfo:
+    path: str
+    format_tag: int
+    sample_rate: int
+    channels: int
+    bits: int
+    frames: int
+    data_offset: int
+
+    @property
+    def dtype(self) -> np.dtype:
+        return _SAMPLE_FORMATS[(self.format_tag, self.bits)]
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.channels * self.bits // 8
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+
+def read_info(path: str) -> WavInfo:
+    """Parse the RIFF/WAVE header of `path` without touching sample data."""
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] not in (b"RIFF", b"RF64") \
+                or header[8:] != b"WAVE":
+            raise ValueError("Unsupported audio format; upload a WAV file")
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError("WAV file has no data chunk")
+            chunk_id, size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt ":
+                fmt = f.read(size + (size & 1))
+            elif chunk_id == b"data":
+                offset = f.tell()
+                break
+            else:
+                f.seek(size + (size & 1), 1)
+    if fmt is None or len(fmt) < 16:
+        raise ValueError("WAV file has no fmt chunk")
+    tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag = struct.unpack("<H", fmt[24:26])[0]
+    if (tag, bits) not in _SAMPLE_FORMATS or not channels:
+        raise ValueError(f"Unsupported WAV sample format ({tag}, {bits}-bit)")
+    # Streaming writers leave the size at 0 or 0xFFFFFFFF; trust the file
+    available = os.path.getsize(path) - offset
+    if size == 0 or size == 0xFFFFFFFF or size > available:
+        size = available
+    frames = size // (channels * bits // 8)
+    return WavInfo(path, tag, rate, channels, bits, frames, offset)
+
+
+class WavFile:
+    """A WAV file whose samples are a (frames, channels) memmap.
+
+    Opened read-only by default; `mode="r+"` maps the samples writable so
+    several processes can fill disjoint frame ranges of one output file.
+    """
+
+    def __init__(self, path: str, mode: str = "r"):
+        self.info = read_info(path)
+        self.data = np.memmap(path, dtype=self.info.dtype, mode=mode,
+                              offset=self.info.data_offset,
+                              shape=(self.info.frames, self.info.channels))
+
+    @property
+    def sample_rate(self) -> int:
+        return self.info.sample_rate
+
+    @property
+    def channels(self) -> int:
+        return self.info.channels
+
+    def __len__(self) -> int:
+        return self.info.frames
+
+    def frames(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """Zero-copy view of frames [start, stop)."""
+        return self.data[start:stop]
+
+    def channel(self, index: int, start: int = 0, stop: int = None) -> np.ndarray:
+        """Zero-copy (strided) view of one channel."""
+        return self.data[start:stop, index]
+
+    def chunks(self, chunk_frames: int, start: int = 0,
+               stop: int = None) -> Iterator[Tuple[int, np.ndarray]]:
+        """Yield (first_frame, view) pairs covering [start, stop)."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for first in range(start, stop, chunk_frames):
+            yield first, self.data[first:min(first + chunk_frames, stop)]
+
+    def close(self):
+        if self.data is not None and self.data.mode == "r+":
+            self.data.flush()
+        mm = getattr(self.data, "_mmap", None)
+        self.data = None
+        if mm is not None:
+            mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def create_wav(path: str, sample_rate: int, channels: int, frames: int,
+               dtype: np.dtype) -> np.memmap:
+    """Write a WAV header for `frames` and return a writable sample memmap."""
+    dtype = np.dtype(dtype)
+    tag = next((t for (t, _), d in _SAMPLE_FORMATS.items() if d == dtype), None)
+    if tag is None:
+        raise ValueError(f"Cannot write WAV samples of type {dtype}")
+    frame_bytes = channels * dtype.itemsize
+    data_size = frames * frame_bytes
+    with open(path, "wb") as f:
+        f.write(struct.pack(
+            "<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + data_size, b"WAVE",
+            b"fmt ", 16, tag, channels, sample_rate,
+            sample_rate * frame_bytes, frame_bytes, dtype.itemsize * 8,
+            b"data", data_size))
+        f.truncate(44 + data_size)
+    shape = (frames, channels) + dtype.shape
+    return np.memmap(path, dtype=dtype.base if dtype.shape else dtype,
+                     mode="r+", offset=44, shape=shape)
+
+
+def to_float(x: np.ndarray) -> np.ndarray:
+    """Convert a sample view to float64 in [-1, 1)."""
+    if x.dtype.kind == "f":
+        return x.astype(np.float64)
+    if x.ndim == 3:  # packed 24-bit: (frames, channels, 3) little-endian bytes
+        wide = (x[..., 0].astype(np.int32)
+                | (x[..., 1].astype(np.int32) << 8)
+                | (x[..., 2].astype(np.int32) << 16))
+        return ((wide ^ 0x800000) - 0x800000) / float(1 << 23)
+    if x.dtype == np.uint8:
+        return (x.astype(np.float64) - 128.0) / 128.0
+    return x.astype(np.float64) / float(-np.iinfo(x.dtype).min)
+
+
+def from_float(x: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """Convert float samples to `dtype`, rounding and clipping integers."""
+    dtype = np.dtype(dtype)
+    if dtype.kind == "f":
+        return x.astype(dtype)
+    if dtype.shape:  # packed 24-bit
+        wide = np.clip(np.round(x * float(1 << 23)), -(1 << 23), (1 << 23) - 1)
+        wide = wide.astype(np.int32)
+        return np.stack([(wide >> s) & 0xFF for s in (0, 8, 16)],
+                        axis=-1).astype(np.uint8)
+    if dtype == np.uint8:
+        return np.clip(np.round(x * 128.0 + 128.0), 0, 255).astype(np.uint8)
+    info = np.iinfo(dtype)
+    return np.clip(np.round(x * -float(info.min)), info.min, info.max).astype(dtype)
@@ -0,0 +1,258 @@
+# tools/fingerprint.py
+"""Spectral-peak audio fingerprints and an on-disk inverted index.
+
+A fingerprint is a set of landmark hashes: the WAV is read in blocks from
+its memmap, downmixed, and turned into a log-magnitude spectrogram with
+fixed-duration frames (so files at different sample rates line up);
+local spectral peaks are paired with a few peaks just after them, and each
+pair packs (anchor band, target band, frame gap) into one integer stored
+with the anchor's frame offset.
+
+Re-encodes, gain changes and format conversions keep most peaks, so a
+near-duplicate shares many hashes *at a consistent time offset* with the
+original. The index (SQLite, clustered by hash) looks every query hash up
+and votes on (track, offset difference); the best-aligned track wins.
+"""
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from tools.audio_io import WavFile, to_float
+
+WINDOW_SECONDS = 0.0929   # ~1024 samples at 11.025 kHz
+HOP_SECONDS = 0.0464      # half a window
+BAND_HZ = 11025 / 1024    # spectrogram resolution after folding bins into bands
+MAX_HZ = 5000.0           # peaks above this are too fragile under lossy codecs
+PEAK_FRAMES = 5           # a peak is the maximum within +/- this many frames
+PEAK_BANDS = 15           # ... and +/- this many bands
+PEAK_FLOOR_DB = 60.0      # ignore peaks this far below the loudest one
+PEAKS_PER_SECOND = 30     # keep only the strongest; weak ones are mostly noise
+FAN_OUT = 5               # targets paired with each anchor peak
+MAX_GAP = 63              # frames; fits the 6-bit gap field
+BLOCK_FRAMES = 256        # STFT frames computed per block read
+MIN_MATCHES = 50          # aligned hashes needed (unrelated tracks reach ~10)
+MIN_RATIO = 0.01          # ... and as a fraction of the query's hashes
+_QUERY_BATCH = 5000
+
+
+@dataclass
+class Fingerprint:
+    hashes: np.ndarray   # uint32 landmark hashes
+    offsets: np.ndarray  # int32 anchor frame of each hash
+    duration: float
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+
+@dataclass
+class Match:
+    track_id: str
+    score: int            # hashes agreeing on the best time offset
+    ratio: float          # score / hashes in the query
+    offset_seconds: float  # where the query starts within the match
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"track_id": self.track_id, "score": self.score,
+                "ratio": round(self.ratio, 3),
+                "offset_seconds": round(self.offset_seconds, 3)}
+
+
+def _spectrogram(path: str) -> np.ndarray:
+    """(frames, bands) log-magnitude spectrogram, read block by block."""
+    with WavFile(path) as wav:
+        rate, total = wav.sample_rate, len(wav)
+        window = int(round(rate * WINDOW_SECONDS))
+        nfft = 1 << (window - 1).bit_length()
+        bins = np.fft.rfftfreq(nfft, 1 / rate)
+        bands = (bins[bins < MAX_HZ] // BAND_HZ).astype(np.int64)
+        band_starts = np.flatnonzero(np.diff(bands, prepend=-1))
+        taper = np.hanning(window).astype(np.float32)
+        # Frame positions are placed in seconds, not rounded hop lengths,
+        # so every sample rate yields the same frame grid
+        starts = np.round(np.arange(max(0, total - window) // (rate * HOP_SECONDS) + 1)
+                          * HOP_SECONDS * rate).astype(np.int64)
+        starts = starts[starts + window <= total]
+        out = []
+        for first in range(0, len(starts), BLOCK_FRAMES):
+            block = starts[first:first + BLOCK_FRAMES]
+            lo, hi = block[0], block[-1] + window
+            mono = to_float(wav.frames(lo, hi)).mean(axis=1).astype(np.float32)
+            frames = mono[(block - lo)[:, None] + np.arange(window)] * taper
+            mag = np.abs(np.fft.rfft(frames, n=nfft))[:, :len(bands)]
+            out.append(np.maximum.reduceat(mag, band_starts, axis=1))
+    if not out:
+        return np.zeros((0, 0), dtype=np.float32)
+    return (20 * np.log10(np.concatenate(out) + 1e-9)).astype(np.float32)
+
+
+def _max_filter(x: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (radius, radius)
+    padded = np.pad(x, pad, constant_values=-np.inf)
+    out = np.full_like(x, -np.inf)
+    n = x.shape[axis]
+    for shift in range(2 * radius + 1):
+        np.maximum(out, np.take(padded, range(shift, shift + n), axis=axis), out=out)
+    return out
+
+
+def _peaks(spec: np.ndarray):
+    if not spec.size:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    local = _max_filter(_max_filter(spec, PEAK_FRAMES, 0), PEAK_BANDS, 1)
+    t, f = np.nonzero((spec == local) & (spec > spec.max() - PEAK_FLOOR_DB))
+    # Per one-second bucket, keep the PEAKS_PER_SECOND loudest peaks
+    level = spec[t, f]
+    bucket = (t * HOP_SECONDS).astype(np.int64)
+    order = np.lexsort((-level, bucket))
+    rank = np.arange(len(order)) - np.searchsorted(bucket[order], bucket[order])
+    keep = np.sort(order[rank < PEAKS_PER_SECOND])
+    return t[keep], f[keep]  # sorted by frame, then band
+
+
+def fingerprint_wav(path: str) -> Fingerprint:
+    """Fingerprint the WAV at `path` in bounded memory."""
+    spec = _spectrogram(path)
+    t, f = _peaks(spec)
+    hashes, offsets = [], []
+    paired = np.zeros(len(t), dtype=np.int64)
+    # Pair each anchor with the next FAN_OUT peaks inside the gap window
+    for k in range(1, 4 * FAN_OUT + 1):
+        if k >= len(t):
+            break
+        gap = t[k:] - t[:-k]
+        ok = (gap > 0) & (gap <= MAX_GAP) & (paired[:-k] < FAN_OUT)
+        anchors = np.flatnonzero(ok)
+        paired[anchors] += 1
+        hashes.append((f[anchors] << 15) | (f[anchors + k] << 6) | gap[anchors])
+        offsets.append(t[anchors])
+    duration = len(spec) * HOP_SECONDS
+    if not hashes:
+        return Fingerprint(np.zeros(0, np.uint32), np.zeros(0, np.int32), duration)
+    return Fingerprint(np.concatenate(hashes).astype(np.uint32),
+                       np.concatenate(offsets).astype(np.int32), duration)
+
+
+class FingerprintIndex:
+    """Inverted index of hash -> (track, offset) in a local SQLite file."""
+
+    def __init__(self, path: str = "./fingerprints.db",
+                 min_matches: int = MIN_MATCHES, min_ratio: float = MIN_RATIO):
+        self.min_matches = min_matches
+        self.min_ratio = min_ratio
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            " id INTEGER PRIMARY KEY, track_id TEXT UNIQUE NOT NULL,"
+            " duration REAL NOT NULL, hashes INTEGER NOT NULL,"
+            " created_at REAL NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " hash INTEGER NOT NULL, track INTEGER NOT NULL, offset INTEGER NOT NULL,"
+            " PRIMARY KEY (hash, track, offset)) WITHOUT ROWID")
+        # Replacing or removing a track deletes its hashes by track
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS hashes_track ON hashes(track)")
+        # Exact uploads (by content hash) already identified as a track
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " audio_sha256 TEXT PRIMARY KEY, track_id TEXT NOT NULL)")
+        self._db.commit()
+        self.lookups = 0
+        self.matches = 0
+
+    def add(self, track_id: str, fp: Fingerprint):
+        """Index `fp` under `track_id` (re-adding replaces it)."""
+        with self._lock:
+            self._remove(track_id)
+            cur = self._db.execute(
+                "INSERT INTO tracks (track_id, duration, hashes, created_at)"
+                " VALUES (?, ?, ?, ?)", (track_id, fp.duration, len(fp), time.time()))
+            track = cur.lastrowid
+            self._db.executemany(
+                "INSERT OR IGNORE INTO hashes VALUES (?, ?, ?)",
+                zip(fp.hashes.tolist(), [track] * len(fp), fp.offsets.tolist()))
+            self._db.commit()
+
+    def remember(self, audio_sha256: str, track_id: str):
+        """Record that the upload with this content hash is `track_id`."""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?)",
+                             (audio_sha256, track_id))
+            self._db.commit()
+
+    def track_for(self, audio_sha256: str) -> Optional[str]:
+        """The track an already-seen upload was identified as, if any."""
+        with self._lock:
+            row = self._db.execute("SELECT track_id FROM uploads WHERE audio_sha256 = ?",
+                                   (audio_sha256,)).fetchone()
+        return row[0] if row else None
+
+    def remove(self, track_id: str):
+        with self._lock:
+            self._remove(track_id)
+            self._db.commit()
+
+    def match(self, fp: Fingerprint) -> Optional[Match]:
+        """Best time-aligned match for `fp`, if it clears the thresholds."""
+        if not len(fp):
+            return None
+        tracks, deltas = [], []
+        with self._lock:
+            self.lookups += 1
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS query"
+                             " (hash INTEGER NOT NULL, offset INTEGER NOT NULL)")
+            self._db.execute("DELETE FROM query")
+            self._db.executemany("INSERT INTO query VALUES (?, ?)",
+                                 zip(fp.hashes.tolist(), fp.offsets.tolist()))
+            cur = self._db.execute(
+                "SELECT h.track, h.offset - q.offset FROM query q"
+                " JOIN hashes h ON h.hash = q.hash")
+            while True:
+                rows = cur.fetchmany(_QUERY_BATCH)
+                if not rows:
+                    break
+                found = np.array(rows, dtype=np.int64)
+                tracks.append(found[:, 0])
+                deltas.append(found[:, 1])
+            self._db.execute("DELETE FROM query")
+            if not tracks:
+                return None
+            # Votes per (track, offset difference); true copies pile up in one bin
+            votes, counts = np.unique(
+                np.concatenate(tracks) << 32 | (np.concatenate(deltas) + (1 << 31)),
+                return_counts=True)
+            best = int(np.argmax(counts))
+            score = int(counts[best])
+            ratio = score / len(fp)
+            if score < self.min_matches or ratio < self.min_ratio:
+                return None
+            track = int(votes[best] >> 32)
+            delta = int(votes[best] & 0xFFFFFFFF) - (1 << 31)
+            track_id = self._db.execute("SELECT track_id FROM tracks WHERE id = ?",
+                                        (track,)).fetchone()[0]
+            self.matches += 1
+        return Match(track_id, score, ratio, delta * HOP_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tracks, hashes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hashes), 0) FROM tracks").fetchone()
+        return {"tracks": tracks, "hashes": hashes, "lookups": self.lookups,
+                "matches": self.matches}
+
+    def _remove(self, track_id: str):
+        # Caller holds the lock
+        row = self._db.execute("SELECT id FROM tracks WHERE track_id = ?",
+                               (track_id,)).fetchone()
+        if row:
+            self._db.execute("DELETE FROM hashes WHERE track = ?", (row[0],))
+            self._db.execute("DELETE FROM tracks WHERE id = ?", (row[0],))
+            self._db.execute("DELETE FROM uploads WHERE track_id = ?", (track_id,))
@@ -0,0 +1,384 @@
+# tools/loudness.py
+"""ITU-R BS.1770 loudness measurement and normalization for WAV files.
+
+Audio is streamed from a memory-mapped WAV (see `tools.audio_io`) in
+fixed-size chunks, so a long stem is processed in constant memory and
+independent segments can be spread across processes. Filtering is done
+block-wise with FFT overlap-add instead of a per-sample loop.
+"""
+import math
+from concurrent.futures import Executor, as_completed
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from tools.audio_io import WavFile, create_wav, from_float, read_info, to_float
+
+CHUNK_FRAMES = 1 << 18          # frames per processing chunk
+SEGMENT_SECONDS = 30.0          # unit of work handed to a process pool
+HOP_SECONDS = 0.1               # gating blocks are 4 hops (400 ms, 75% overlap)
+ABSOLUTE_GATE = -70.0           # LUFS
+RELATIVE_GATE = -10.0           # LU below the absolute-gated loudness
+OVERSAMPLE = 4                  # true-peak oversampling factor
+LIMITER_BLOCK = 32              # frames per limiter gain step
+LIMITER_WINDOW = 0.005          # seconds of look-ahead/hold on each side
+
+def _to_db(value: float) -> Optional[float]:
+    if value <= 0:
+        return None
+    return round(20 * math.log10(value), 2)
+
+
+def _lfilter(b, a, x: np.ndarray) -> np.ndarray:
+    # Direct-form biquad; only used to build short impulse responses
+    y = np.zeros_like(x)
+    x1 = x2 = y1 = y2 = 0.0
+    for n, xn in enumerate(x):
+        yn = b[0] * xn + b[1] * x1 + b[2] * x2 - a[1] * y1 - a[2] * y2
+        x2, x1, y2, y1 = x1, xn, y1, yn
+        y[n] = yn
+    return y
+
+
+@lru_cache(maxsize=8)
+def _k_weighting_ir(rate: int) -> np.ndarray:
+    """Impulse response of the BS.1770 K-weighting filter at `rate`.
+
+    Coefficients follow the standard's pre-filter (high shelf) and RLB
+    high-pass, re-derived for sample rates other than 48 kHz. The IIR is
+    truncated at 100 ms, by which point it has decayed below 1e-9.
+    """
+    k = math.tan(math.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0,
+               (vh - vb * k / q + k * k) / a0]
+    shelf_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    k = math.tan(math.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    hp_b = [1.0, -2.0, 1.0]
+    hp_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    impulse = np.zeros(int(rate * 0.1))
+    impulse[0] = 1.0
+    return _lfilter(hp_b, hp_a, _lfilter(shelf_b, shelf_a, impulse))
+
+
+@lru_cache(maxsize=1)
+def _oversampling_phases() -> np.ndarray:
+    """Polyphase interpolation filter (OVERSAMPLE x 12 taps) for true peak."""
+    taps = 12 * OVERSAMPLE
+    t = (np.arange(taps) - (taps - 1) / 2) / OVERSAMPLE
+    h = np.sinc(t) * np.kaiser(taps, 5.0)
+    phases = h.reshape(-1, OVERSAMPLE).T.copy()
+    return phases / phases.sum(axis=1, keepdims=True)
+
+
+def _fft_size(n: int) -> int:
+    """Smallest 5-smooth length >= n; pocketfft is fast on those."""
+    best = 1 << (n - 1).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            size = p35 << max(0, (n - 1) // p35).bit_length()
+            best = min(best, size)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+class _OverlapAdd:
+    """Streaming FIR filter using FFT overlap-add across chunks."""
+
+    def __init__(self, ir: np.ndarray, channels: int):
+        self.ir = ir
+        self.tail = np.zeros((len(ir) - 1, channels))
+        self._spectra = {}
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        n, taps = len(x), len(self.ir)
+        nfft = _fft_size(n + taps - 1)
+        spectrum = self._spectra.get(nfft)
+        if spectrum is None:
+            spectrum = self._spectra[nfft] = np.fft.rfft(self.ir, nfft)
+        y = np.fft.irfft(np.fft.rfft(x, nfft, axis=0) * spectrum[:, None],
+                         nfft, axis=0)[:n + taps - 1]
+        y[:taps - 1] += self.tail
+        self.tail = y[n:].copy()
+        return y[:n]
+
+
+class LoudnessMeter:
+    """Integrated loudness (LUFS) with absolute and relative gating."""
+
+    def __init__(self, rate: int, channels: int):
+        self.hop = int(round(rate * HOP_SECONDS))
+        self.filter = _OverlapAdd(_k_weighting_ir(rate), channels)
+        self.weights = _channel_weights(channels)
+        self._hops = []
+        self._partial = np.zeros(channels)
+        self._partial_len = 0
+
+    def prime(self, x: np.ndarray):
+        """Run `x` through the filter without counting it (segment warm-up)."""
+        self.filter.process(x)
+
+    def feed(self, x: np.ndarray):
+        sq = np.square(self.filter.process(x))
+        i = 0
+        if self._partial_len:
+            i = min(self.hop - self._partial_len, len(sq))
+            self._partial += sq[:i].sum(axis=0)
+            self._partial_len += i
+            if self._partial_len < self.hop:
+                return
+            self._hops.append(self._partial[None, :])
+            self._partial = np.zeros_like(self._partial)
+            self._partial_len = 0
+        full = (len(sq) - i) // self.hop
+        if full:
+            end = i + full * self.hop
+            self._hops.append(sq[i:end].reshape(full, self.hop, -1).sum(axis=1))
+            i = end
+        self._partial = sq[i:].sum(axis=0)
+        self._partial_len = len(sq) - i
+
+    def hop_energy(self) -> np.ndarray:
+        """Summed K-weighted energy per complete hop, shape (hops, channels)."""
+        if not self._hops:
+            return np.zeros((0, len(self.weights)))
+        return np.concatenate(self._hops)
+
+    def integrated(self) -> float:
+        return gated_loudness(self.hop_energy() / self.hop, self.weights)
+
+
+def _channel_weights(channels: int) -> np.ndarray:
+    # Surround channels (Ls/Rs in 5.1 order) are weighted +1.5 dB
+    if channels == 6:
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    return np.ones(channels)
+
+
+def gated_loudness(hops: np.ndarray, weights: np.ndarray) -> float:
+    """Integrated loudness from per-hop mean-square energies."""
+    if len(hops) < 4:
+        return -math.inf
+    acc = np.concatenate([np.zeros((1, hops.shape[1])),
+                          np.cumsum(hops, axis=0)])
+    power = ((acc[4:] - acc[:-4]) / 4) @ weights
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(power)
+    gated = power[loudness > ABSOLUTE_GATE]
+    if not len(gated):
+        return -math.inf
+    relative = -0.691 + 10 * math.log10(gated.mean()) + RELATIVE_GATE
+    final = power[(loudness > ABSOLUTE_GATE) & (loudness > relative)]
+    return -0.691 + 10 * math.log10(final.mean())
+
+
+class TruePeakMeter:
+    """Inter-sample peak estimate via polyphase oversampling."""
+
+    def __init__(self, channels: int):
+        self.phases = _oversampling_phases()
+        self.history = np.zeros((self.phases.shape[1] - 1, channels))
+        self.peak = 0.0
+
+    def prime(self, x: np.ndarray):
+        """Seed the interpolation history with `x` without measuring it."""
+        taps = self.phases.shape[1]
+        padded = np.concatenate([self.history, x])
+        self.history = padded[len(padded) - (taps - 1):]
+
+    def feed(self, x: np.ndarray) -> np.ndarray:
+        """Return the per-frame peak across channels and phases."""
+        n, taps = len(x), self.phases.shape[1]
+        padded = np.concatenate([self.history, x])
+        self.history = padded[len(padded) - (taps - 1):]
+        frame_peak = np.zeros(n)
+        # Work channel by channel on contiguous 1-D arrays; reductions across
+        # a short trailing axis are far slower than elementwise maxima.
+        for channel in np.ascontiguousarray(padded.T):
+            np.maximum(frame_peak, np.abs(channel[taps - 1:]), out=frame_peak)
+            interpolated = self.phases @ sliding_window_view(channel, taps).T
+            np.maximum(frame_peak, np.abs(interpolated).max(axis=0),
+                       out=frame_peak)
+        if n:
+            self.peak = max(self.peak, float(frame_peak.max()))
+        return frame_peak
+
+
+def _block_max(frame_peak: np.ndarray) -> np.ndarray:
+    pad = -len(frame_peak) % LIMITER_BLOCK
+    if pad:
+        frame_peak = np.concatenate([frame_peak, np.zeros(pad)])
+    return frame_peak.reshape(-1, LIMITER_BLOCK).max(axis=1)
+
+
+def limiter_gains(block_peaks: np.ndarray, ceiling: float,
+                  rate: int) -> np.ndarray:
+    """Per-block gain that keeps `block_peaks` under `ceiling`.
+
+    The raw gain is min-held over +-w blocks, then smoothed with a centered
+    moving average no wider than the hold, so every block's gain stays at
+    or below what its own peak requires.
+    """
+    target = np.minimum(1.0, ceiling / np.maximum(block_peaks, 1e-12))
+    if not len(target) or target.min() >= 1.0:
+        return np.ones_like(target)
+    w = max(1, int(math.ceil(rate * LIMITER_WINDOW / LIMITER_BLOCK)))
+    held = sliding_window_view(np.pad(target, w, constant_values=1.0),
+                               2 * w + 1).min(axis=1)
+    acc = np.concatenate([[0.0], np.cumsum(np.pad(held, w, mode="edge"))])
+    return (acc[2 * w + 1:] - acc[:-(2 * w + 1)]) / (2 * w + 1)
+
+
+def _segments(frames: int, rate: int) -> List[Tuple[int, int]]:
+    # Segment edges sit on both hop and limiter-block boundaries, so the
+    # per-segment hop energies and block peaks concatenate exactly.
+    align = math.lcm(int(round(rate * HOP_SECONDS)), LIMITER_BLOCK)
+    size = max(align, int(rate * SEGMENT_SECONDS) // align * align)
+    return [(s, min(s + size, frames)) for s in range(0, frames, size)]
+
+
+def process_segment(in_path: str, start: int, stop: int, gain: float = 1.0,
+                    block_gain: Optional[np.ndarray] = None,
+                    out_path: Optional[str] = None) -> Dict:
+    """Measure, and optionally render, frames [start, stop) of `in_path`.
+
+    With `block_gain` (the limiter gains for this segment's blocks, plus its
+    warm-up) the gained signal is written into the pre-sized `out_path`
+    and measured instead of the input. Filters are warmed up on the frames
+    just before `start`, so segments give the same numbers as one serial
+    pass. Only small arrays cross the process boundary; the audio itself is
+    shared through the memory-mapped files.
+    """
+    with WavFile(in_path) as src:
+        rate, channels, dtype = src.sample_rate, src.channels, src.info.dtype
+        warmup = -(-len(_k_weighting_ir(rate)) // LIMITER_BLOCK) * LIMITER_BLOCK
+        warmup = min(start, warmup)
+        meter = LoudnessMeter(rate, channels)
+        peaks = TruePeakMeter(channels)
+        out = WavFile(out_path, mode="r+") if out_path else None
+
+        def render(first: int, view: np.ndarray) -> np.ndarray:
+            x = to_float(view)
+            if block_gain is None:
+                return x
+            block = (first - (start - warmup)) // LIMITER_BLOCK
+            g = np.repeat(block_gain[block:block + -(-len(x) // LIMITER_BLOCK)],
+                          LIMITER_BLOCK)[:len(x)]
+            y = from_float(x * (gain * g)[:, None], dtype)
+            if first >= start:
+                out.data[first:first + len(y)] = y
+            return to_float(y)
+
+        if warmup:
+            x = render(start - warmup, src.frames(start - warmup, start))
+            meter.prime(x)
+            peaks.prime(x)
+        block_peaks = []
+        for first, view in src.chunks(CHUNK_FRAMES, start, stop):
+            x = render(first, view)
+            meter.feed(x)
+            block_peaks.append(_block_max(peaks.feed(x)))
+        if out:
+            out.close()
+    return {"hops": meter.hop_energy(),
+            "block_peaks": np.concatenate(block_peaks),
+            "peak": peaks.peak}
+
+
+def _run_segments(calls: List[Tuple], executor: Optional[Executor],
+                  progress: Optional[Callable[[float], None]],
+                  base: float) -> List[Dict]:
+    """Run process_segment over `calls`, in order, on `executor` if given."""
+    results = [None] * len(calls)
+    if executor is None:
+        for i, args in enumerate(calls):
+            results[i] = process_segment(*args)
+            if progress:
+                progress(base + 0.5 * (i + 1) / len(calls))
+        return results
+    futures = {executor.submit(process_segment, *args): i
+               for i, args in enumerate(calls)}
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress(base + 0.5 * done / len(calls))
+    except BaseException:
+        # A failed segment or a cancelling progress callback: don't leave
+        # the rest of the file queued on the pool
+        for future in futures:
+            future.cancel()
+        raise
+    return results
+
+
+def master_wav(in_path: str, out_path: str, target_lufs: float = -14.0,
+               ceiling_dbtp: float = -1.0,
+               progress: Optional[Callable[[float], None]] = None,
+               executor: Optional[Executor] = None) -> Dict:
+    """Normalize `in_path` to `target_lufs` with a true-peak limiter.
+
+    Two passes over SEGMENT_SECONDS segments: the first measures loudness
+    and per-block true peaks, the second applies gain plus limiting and
+    writes `out_path` in the input's sample format. Segments run on
+    `executor` (e.g. a ProcessPoolExecutor) when one is given.
+    """
+    info = read_info(in_path)
+    frames, channels, rate = info.frames, info.channels, info.sample_rate
+    if not frames:
+        raise ValueError("WAV file contains no audio")
+    segments = _segments(frames, rate)
+    weights = _channel_weights(channels)
+    hop = int(round(rate * HOP_SECONDS))
+
+    # Pass 1: measure
+    measured = _run_segments([(in_path, s, e) for s, e in segments],
+                             executor, progress, 0.0)
+    input_lufs = gated_loudness(
+        np.concatenate([m["hops"] for m in measured]) / hop, weights)
+
+    # Silence (or too short to gate) is passed through untouched
+    gain_db = target_lufs - input_lufs if math.isfinite(input_lufs) else 0.0
+    gain = 10 ** (gain_db / 20)
+    block_gain = limiter_gains(
+        np.concatenate([m["block_peaks"] for m in measured]) * gain,
+        10 ** (ceiling_dbtp / 20), rate)
+
+    # Pass 2: apply, re-measuring what we write
+    # Size the output once; segments then fill it in place
+    create_wav(out_path, rate, channels, frames, info.dtype).flush()
+    warmup = -(-len(_k_weighting_ir(rate)) // LIMITER_BLOCK)
+    calls = []
+    for s, e in segments:
+        first = max(0, s // LIMITER_BLOCK - warmup)
+        calls.append((in_path, s, e, gain,
+                      block_gain[first:-(-e // LIMITER_BLOCK)], out_path))
+    rendered = _run_segments(calls, executor, progress, 0.5)
+    output_lufs = gated_loudness(
+        np.concatenate([r["hops"] for r in rendered]) / hop, weights)
+
+    reduction = float(block_gain.min())
+    return {
+        "input_lufs": round(input_lufs, 2) if math.isfinite(input_lufs) else None,
+        "output_lufs": round(output_lufs, 2) if math.isfinite(output_lufs) else None,
+        "target_lufs": target_lufs,
+        "gain_db": round(gain_db, 2),
+        "limiter_reduction_db": max(0.0, round(-20 * math.log10(reduction), 2)),
+        "input_true_peak_dbtp": _to_db(max(m["peak"] for m in measured)),
+        "true_peak_dbtp": _to_db(max(r["peak"] for r in rendered)),
+        "sample_rate": rate,
+        "channels": channels,
+        "duration_s": round(frames / rate, 3),
+    }
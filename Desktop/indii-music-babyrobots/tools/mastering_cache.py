@@ -0,0 +1,145 @@
+# tools/mastering_cache.py
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def spool_and_hash(src, dst) -> str:
+    """Copy file object `src` into `dst` while computing its SHA-256."""
+    digest = hashlib.sha256()
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        dst.write(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(audio_sha256: str, params: Dict[str, Any]) -> str:
+    """Stable key for an audio digest plus the mastering parameters."""
+    blob = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{audio_sha256}:{blob}".encode()).hexdigest()
+
+
+class ResultCache:
+    """Size-bounded, LRU-evicted store of mastering results on local disk.
+
+    Result metadata lives in a small SQLite index; optional artifacts (the
+    mastered audio) live next to it under `objects/` and count towards
+    `max_bytes`.
+    """
+
+    def __init__(self, root: str = "./mastering_cache",
+                 max_bytes: int = 2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.db"),
+                                   check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL,"
+            " artifact TEXT, size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access)")
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, artifact FROM entries WHERE key = ?",
+                (key,)).fetchone()
+            if row and (row[1] is None or os.path.exists(row[1])):
+                self._db.execute(
+                    "UPDATE entries SET last_access = ? WHERE key = ?",
+                    (time.time(), key))
+                self._db.commit()
+                self.hits += 1
+                return json.loads(row[0])
+            if row:
+                # Artifact vanished underneath us; treat as a miss
+                self._delete(key, row[1])
+                self._db.commit()
+            self.misses += 1
+            return None
+
+    def put(self, key: str, result: Dict[str, Any],
+            artifact_path: Optional[str] = None) -> Optional[str]:
+        """Store `result`; moves `artifact_path` into the cache if given.
+
+        Returns the artifact's new path, if any. The new entry itself is
+        never evicted here, so its artifact is servable once put() returns;
+        one larger than `max_bytes` stays until the next put() evicts it.
+        """
+        stored = None
+        size = len(json.dumps(result))
+        if artifact_path:
+            ext = os.path.splitext(artifact_path)[1]
+            stored = os.path.join(self.objects_dir, key + ext)
+            shutil.move(artifact_path, stored)
+            size += os.path.getsize(stored)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(result), stored, size, time.time()))
+            self._evict(keep=key)
+            self._db.commit()
+        return stored
+
+    def artifact_path(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT artifact FROM entries WHERE key = ?",
+                (key,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _evict(self, keep: str):
+        # Caller holds the lock; drop least recently used entries other than
+        # `keep` until we fit
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, artifact, size in self._db.execute(
+                "SELECT key, artifact, size FROM entries WHERE key != ?"
+                " ORDER BY last_access", (keep,)).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._delete(key, artifact)
+            self.evictions += 1
+            total -= size
+
+    def _delete(self, key: str, artifact: Optional[str]):
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if artifact and os.path.exists(artifact):
+            os.remove(artifact)
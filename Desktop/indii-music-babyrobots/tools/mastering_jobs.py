@@ -0,0 +1,235 @@
+# tools/mastering_jobs.py
+import asyncio
+import contextvars
+import ipaddress
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at its depth limit."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once its job has been cancelled."""
+
+
+class InvalidWebhookError(Exception):
+    """Raised for a webhook URL the queue refuses to call."""
+
+
+@dataclass
+class Job:
+    payload: Dict[str, Any]
+    webhook_url: Optional[str] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued -> running -> done | failed | cancelled
+    progress: float = 0.0
+    cancel_requested: bool = False
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # The submitting request's context (e.g. its trace), used to run the handler
+    context: contextvars.Context = field(default_factory=contextvars.copy_context,
+                                         repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def check_cancelled(self):
+        """Handlers call this between steps to stop early once cancelled."""
+        if self.cancel_requested:
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """Bounded queue of jobs drained by a fixed number of workers.
+
+    `handler(job)` is a blocking callable run on `executor`; it returns the
+    job result dict or raises. Finished jobs are kept (up to `max_finished`)
+    so clients can poll for results. Jobs still waiting when the queue stops
+    are cancelled and passed to `on_discard` so their resources are freed.
+
+    Webhooks must be http(s). With `webhook_allow` only those hosts are
+    called; without it, any host that resolves to a non-public address
+    (loopback, private, link-local, ...) is refused.
+    """
+
+    def __init__(self, handler: Callable[[Job], Dict[str, Any]],
+                 workers: int = 2, max_queue: int = 16,
+                 max_finished: int = 1000,
+                 executor: Optional[Executor] = None,
+                 on_discard: Optional[Callable[[Job], None]] = None,
+                 webhook_allow: Optional[Iterable[str]] = None):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_finished = max_finished
+        self.on_discard = on_discard
+        self.webhook_allow = {h.lower() for h in webhook_allow or ()}
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="mastering")
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._http: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._http = httpx.AsyncClient(timeout=10)
+        self._tasks = [asyncio.create_task(self._worker())
+                       for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        queue, self._queue = self._queue, None
+        while queue is not None and not queue.empty():
+            job = queue.get_nowait()
+            if not job.finished:
+                job.cancel_requested = True
+                job.status = "cancelled"
+                job.finished_at = time.time()
+            if self.on_discard:
+                try:
+                    self.on_discard(job)
+                except Exception:
+                    logger.exception("Discarding mastering job %s failed", job.id)
+        if self._http:
+            await self._http.aclose()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    @property
+    def free_slots(self) -> int:
+        return self.max_queue - self.depth
+
+    def check_webhook(self, url: str) -> str:
+        """Return the host of `url`, or raise InvalidWebhookError if it is
+        not an http(s) URL we may call. Hostnames are resolved and checked
+        again when the webhook fires."""
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        if parts.scheme not in ("http", "https") or not host:
+            raise InvalidWebhookError("Webhook URL must be http(s) with a host")
+        if self.webhook_allow:
+            if host not in self.webhook_allow:
+                raise InvalidWebhookError(f"Webhook host {host!r} is not allowed")
+            return host
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return host
+        if not address.is_global:
+            raise InvalidWebhookError(f"Webhook host {host!r} is not public")
+        return host
+
+    def submit(self, payload: Dict[str, Any],
+               webhook_url: Optional[str] = None) -> Job:
+        if self._queue is None:
+            raise RuntimeError("JobQueue is not running; call start() first")
+        if webhook_url:
+            self.check_webhook(webhook_url)
+        job = Job(payload=payload, webhook_url=webhook_url)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(
+                f"Mastering queue is full ({self.max_queue} jobs waiting)")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job: queued ones never start, running ones stop at
+        their handler's next check_cancelled()."""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_requested = True
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished_at = time.time()
+        return job
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            # Cancelled jobs still pass through the handler, which stops at
+            # once but gets to clean up after itself
+            if job.status != "cancelled":
+                job.status = "running"
+                job.started_at = time.time()
+            try:
+                job.result = await loop.run_in_executor(
+                    self.executor, job.context.run, self.handler, job)
+                job.status = "done"
+                job.progress = 1.0
+            except JobCancelled:
+                job.status = "cancelled"
+            except Exception as e:
+                logger.exception("Mastering job %s failed", job.id)
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+                self._evict()
+            if job.webhook_url:
+                await self._notify(job)
+
+    async def _notify(self, job: Job):
+        try:
+            host = self.check_webhook(job.webhook_url)
+            if not self.webhook_allow:
+                await self._check_resolves_public(host)
+            r = await self._http.post(job.webhook_url, json=job.to_dict())
+            r.raise_for_status()
+        except Exception as e:
+            logger.warning("Webhook for job %s failed: %s", job.id, e)
+
+    @staticmethod
+    async def _check_resolves_public(host: str):
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None)
+        for info in infos:
+            if not ipaddress.ip_address(info[4][0].split("%")[0]).is_global:
+                raise InvalidWebhookError(f"Webhook host {host!r} is not public")
+
+    def _evict(self):
+        # Drop the oldest finished jobs once we hold too many
+        finished = [j.id for j in self.jobs.values() if j.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
@@ -1,47 +1,367 @@
-import uvicorn
-from fastapi import FastAPI, UploadFile, File
-import httpx
-import tempfile
+"""Mastering-MCP service.
+
+Its imports are rooted at the project root (``tools.*``, ``tracing``), so
+run it from there as a module rather than as a script:
+
+    python -m uvicorn tools.mastering_mcp:app --host 0.0.0.0 --port 8001
+"""
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from collections import OrderedDict
+import multiprocessing
+import uuid
 import os
 
-app = FastAPI(title="Mastering-MCP")
+from tools.audio_io import read_info
+from tools.fingerprint import FingerprintIndex, fingerprint_wav
+from tools.loudness import master_wav
+from tools.mastering_cache import ResultCache, cache_key, spool_and_hash
+from tools.mastering_jobs import InvalidWebhookError, Job, JobQueue, QueueFullError
+from tools.scratch import ScratchFullError, ScratchSpace
+from tracing import install as install_tracing, span
+
+MASTERING_PROCESSES = int(os.environ.get("MASTERING_PROCESSES", str(os.cpu_count() or 1)))
+MASTERING_WORKERS = int(os.environ.get("MASTERING_WORKERS", str(max(2, MASTERING_PROCESSES))))
+MASTERING_MAX_QUEUE = int(os.environ.get("MASTERING_MAX_QUEUE", "16"))
+MASTERING_PUBLIC_URL = os.environ.get("MASTERING_PUBLIC_URL", "http://localhost:8001")
+MASTERING_CACHE_DIR = os.environ.get("MASTERING_CACHE_DIR", "./mastering_cache")
+MASTERING_CACHE_MAX_BYTES = int(os.environ.get("MASTERING_CACHE_MAX_BYTES",
+                                               str(2 * 1024 ** 3)))
+MASTERING_SCRATCH_DIR = os.environ.get("MASTERING_SCRATCH_DIR", "./mastering_scratch")
+MASTERING_SCRATCH_QUOTA_BYTES = int(os.environ.get("MASTERING_SCRATCH_QUOTA_BYTES",
+                                                   str(4 * 1024 ** 3)))
+MASTERING_SCRATCH_MIN_FREE_BYTES = int(os.environ.get("MASTERING_SCRATCH_MIN_FREE_BYTES",
+                                                      str(512 * 1024 ** 2)))
+# Comma-separated webhook hosts; empty allows any host with a public address
+MASTERING_WEBHOOK_ALLOW = [h.strip() for h in
+                           os.environ.get("MASTERING_WEBHOOK_ALLOW", "").split(",")
+                           if h.strip()]
+MASTERING_FINGERPRINT_DB = os.environ.get(
+    "MASTERING_FINGERPRINT_DB", os.path.join(MASTERING_CACHE_DIR, "fingerprints.db"))
+# Room for the mastered copy's header beyond the input's size
+OUTPUT_SLACK_BYTES = 64 * 1024
+
+cache = ResultCache(MASTERING_CACHE_DIR, max_bytes=MASTERING_CACHE_MAX_BYTES)
+fingerprints = FingerprintIndex(MASTERING_FINGERPRINT_DB)
+scratch = ScratchSpace(MASTERING_SCRATCH_DIR, quota_bytes=MASTERING_SCRATCH_QUOTA_BYTES,
+                       min_free_bytes=MASTERING_SCRATCH_MIN_FREE_BYTES)
+# Segment-level work fans out here; set up in lifespan() when >1 process
+process_pool: Optional[ProcessPoolExecutor] = None
+batches: "OrderedDict[str, list]" = OrderedDict()
+MAX_BATCHES = 1000
+
+
+def process_mastering(job: Job) -> dict:
+    """Run one queued mastering job; owns and releases its scratch space."""
+    params = job.payload
+    tmp_path = params["path"]
+    # Written into the upload's reservation, then moved into the cache
+    out_path = params["scratch"].path("mastered.wav")
+    def progress(p: float):
+        job.check_cancelled()
+        job.progress = p
+
+    try:
+        job.check_cancelled()
+        # Loudness-normalize toward the requested target with a true-peak
+        # limiter; the mastered file is handed to the result cache, which
+        # serves it from then on.
+        with span("mastering.master_wav"):
+            stats = master_wav(tmp_path, out_path,
+                               target_lufs=params["target_loudness"],
+                               progress=progress, executor=process_pool)
+        params["scratch"].wrote(os.path.getsize(out_path))
+        key = params["cache_key"]
+        result = {"wav_url": f"{MASTERING_PUBLIC_URL}/mastered/{key}.wav",
+                  **stats}
+        with span("mastering.cache_put"):
+            cache.put(key, result, artifact_path=out_path)
+        return result
+    finally:
+        # Drops the upload and anything the cache did not take
+        params["scratch"].release()
+
+
+def discard_mastering(job: Job):
+    """Free the scratch space of a job that was dropped before it ran."""
+    job.payload["scratch"].release()
+
+
+jobs = JobQueue(process_mastering,
+                workers=MASTERING_WORKERS,
+                max_queue=MASTERING_MAX_QUEUE,
+                on_discard=discard_mastering,
+                webhook_allow=MASTERING_WEBHOOK_ALLOW)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global process_pool
+    # Uploads left behind by a crashed server are swept here
+    scratch.open()
+    if MASTERING_PROCESSES > 1:
+        # spawn, not fork: the parent is running threads and an event loop
+        process_pool = ProcessPoolExecutor(
+            max_workers=MASTERING_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"))
+    await jobs.start()
+    yield
+    await jobs.stop()
+    if process_pool:
+        process_pool.shutdown(cancel_futures=True)
+        process_pool = None
+    scratch.close()
+
+
+app = FastAPI(title="Mastering-MCP", lifespan=lifespan)
+install_tracing(app, "mastering-mcp")
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "service": "mastering-mcp"}
+    return {"status": "ok", "service": "mastering-mcp",
+            "queue_depth": jobs.depth, "queue_limit": jobs.max_queue}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {**cache.stats(), "fingerprints": fingerprints.stats()}
+
+@app.get("/scratch/stats")
+def scratch_stats():
+    return scratch.stats()
+
+@app.get("/mastered/{name}")
+def mastered_file(name: str):
+    key, ext = os.path.splitext(os.path.basename(name))
+    path = cache.artifact_path(key)
+    if ext != ".wav" or path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Unknown mastered file")
+    return FileResponse(path, media_type="audio/wav")
 
-@app.post("/master")
+async def _intake(file: UploadFile, target_loudness: float, genre: str):
+    """Spool, validate and cache-check one upload.
+
+    Returns (track, cached_result, None) on a cache hit, otherwise
+    (track, None, payload) for a job; the payload's spooled file then
+    belongs to the caller. `track` names the recording the upload was
+    identified as (re-encodes and edits of a track link to it), while
+    results stay keyed by the upload's own audio.
+    Raises ValueError for audio we cannot process and ScratchFullError
+    when there is no disk budget for it.
+    """
+    # 1. Reserve scratch for the upload and its mastered copy before
+    #    writing a byte, then spool the upload there (hashing on the way)
+    #    so it outlives this request
+    size = file.size
+    if size is None:
+        size = file.file.seek(0, os.SEEK_END)
+        file.file.seek(0)
+    reservation = scratch.reserve(2 * size + OUTPUT_SLACK_BYTES)
+    tmp_path = reservation.path("upload.wav")
+    try:
+        with open(tmp_path, "wb") as tmp, span("intake.spool"):
+            audio_sha256 = await run_in_threadpool(spool_and_hash, file.file, tmp)
+        reservation.wrote(os.path.getsize(tmp_path))
+
+        # 2. Reject anything we cannot memory-map before it takes a slot
+        with span("intake.probe"):
+            read_info(tmp_path)
+    except Exception:
+        reservation.release()
+        raise
+
+    # 3. Byte-identical upload + same parameters: answer from the cache.
+    #    Results are keyed by the upload's own audio; a fingerprint match
+    #    only links recordings, it never stands in for different audio
+    key = cache_key(audio_sha256, {"target_loudness": target_loudness,
+                                   "genre": genre})
+    with span("intake.cache_lookup"):
+        cached = cache.get(key)
+    if cached is not None:
+        reservation.release()
+        track_id = await run_in_threadpool(fingerprints.track_for, audio_sha256)
+        return _track(audio_sha256, track_id or audio_sha256, None), cached, None
+
+    # 4. Identify the recording: a re-encode or edit of a track we have
+    #    seen maps to that track; anything else becomes a new one
+    try:
+        with span("intake.fingerprint"):
+            fp = await run_in_threadpool(fingerprint_wav, tmp_path)
+            match = await run_in_threadpool(fingerprints.match, fp)
+        if match is None:
+            track_id = audio_sha256
+            await run_in_threadpool(fingerprints.add, track_id, fp)
+        else:
+            track_id = match.track_id
+        await run_in_threadpool(fingerprints.remember, audio_sha256, track_id)
+    except Exception:
+        reservation.release()
+        raise
+    return _track(audio_sha256, track_id, match), None, {
+        "path": tmp_path,
+        "scratch": reservation,
+        "filename": file.filename,
+        "content_type": file.content_type,
+        "target_loudness": target_loudness,
+        "genre": genre,
+        "cache_key": key,
+    }
+
+def _track(audio_sha256: str, track_id: str, match) -> dict:
+    return {"track_id": track_id, "audio_sha256": audio_sha256,
+            "duplicate_of": track_id if track_id != audio_sha256 else None,
+            "match": match.to_dict() if match else None}
+
+def _discard(payloads):
+    for payload in payloads:
+        if payload:
+            payload["scratch"].release()
+
+@app.post("/master", status_code=202)
 async def master(file: UploadFile = File(...),
-               target_loudness: float = -14,
-               genre: str = "pop"):
-    tmp_path = None
+                 target_loudness: float = Form(-14),
+                 genre: str = Form("pop"),
+                 webhook_url: Optional[str] = Form(None)):
+    payload = None
+    try:
+        if webhook_url:
+            jobs.check_webhook(webhook_url)
+        track, cached, payload = await _intake(file, target_loudness, genre)
+        if cached is not None:
+            return JSONResponse(status_code=200, content={
+                "job_id": None, "status": "done", "cached": True,
+                "result": cached, "track": track})
+
+        # 5. Hand it to the worker pool; it releases the scratch when done
+        job = jobs.submit(payload, webhook_url=webhook_url)
+        return {"job_id": job.id, "status": job.status,
+                "status_url": f"/master/{job.id}", "track": track}
+    except InvalidWebhookError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except ValueError as e:
+        return JSONResponse(status_code=415, content={"error": str(e)})
+    except ScratchFullError as e:
+        return JSONResponse(status_code=507, content={"error": str(e)},
+                            headers={"Retry-After": "30"})
+    except QueueFullError as e:
+        _discard([payload])
+        return JSONResponse(status_code=429, content={"error": str(e)},
+                            headers={"Retry-After": "5"})
+    except Exception as e:
+        _discard([payload])
+        return JSONResponse(status_code=500,
+                            content={"error": f"Mastering failed: {str(e)}"})
+
+@app.post("/master/batch", status_code=202)
+async def master_batch(files: List[UploadFile] = File(...),
+                       target_loudness: float = Form(-14),
+                       genre: str = Form("pop"),
+                       webhook_url: Optional[str] = Form(None)):
+    entries = []
+    if webhook_url:
+        try:
+            jobs.check_webhook(webhook_url)
+        except InvalidWebhookError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
     try:
-        # 1. Save uploaded file to temp dir
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-            tmp.write(await file.read())
-            tmp_path = tmp.name
-
-        # 2. For demo purposes, return a mock mastered URL
-        # In production, replace with actual mastering service
-        # with open(tmp_path, "rb") as f:
-        #     r = httpx.post(
-        #         "https://api.landr.com/v1/master",
-        #         files={"stems": (file.filename, f, file.content_type)},
-        #         data={"loudness": target_loudness, "genre": genre}
-        #     )
-        #     r.raise_for_status()
-        #     wav_url = r.json()["download_url"]
-        
-        # Mock response for demo
-        wav_url = f"https://demo-storage.com/mastered/{file.filename}"
-        
-        return {"wav_url": wav_url}
+        for file in files:
+            try:
+                entries.append((file.filename,
+                                *await _intake(file, target_loudness, genre)))
+            except ValueError as e:
+                _discard([payload for *_, payload in entries])
+                return JSONResponse(status_code=415,
+                                    content={"error": f"{file.filename}: {e}"})
+            except ScratchFullError as e:
+                _discard([payload for *_, payload in entries])
+                return JSONResponse(status_code=507, headers={"Retry-After": "30"},
+                                    content={"error": f"{file.filename}: {e}"})
+
+        # All or nothing: don't start half an album
+        needed = sum(1 for *_, payload in entries if payload)
+        if needed > jobs.free_slots:
+            _discard([payload for *_, payload in entries])
+            return JSONResponse(status_code=429, headers={"Retry-After": "5"},
+                                content={"error": f"Mastering queue has room for "
+                                                  f"{jobs.free_slots} of {needed} files"})
+
+        batch = []
+        for filename, track, cached, payload in entries:
+            if cached is not None:
+                batch.append({"filename": filename, "job_id": None, "track": track,
+                              "status": "done", "cached": True, "result": cached})
+            else:
+                job = jobs.submit(payload, webhook_url=webhook_url)
+                batch.append({"filename": filename, "job_id": job.id, "track": track})
+        batch_id = uuid.uuid4().hex
+        batches[batch_id] = batch
+        while len(batches) > MAX_BATCHES:
+            batches.popitem(last=False)
+        return {"batch_id": batch_id, "status_url": f"/master/batch/{batch_id}",
+                **_batch_status(batch)}
     except Exception as e:
-        return {"error": f"Mastering failed: {str(e)}"}
-    finally:
-        # 3. Clean up temp file
-        if tmp_path and os.path.exists(tmp_path):
-            os.remove(tmp_path)
+        _discard([payload for *_, payload in entries])
+        return JSONResponse(status_code=500,
+                            content={"error": f"Mastering failed: {str(e)}"})
+
+def _batch_status(batch: list) -> dict:
+    items = []
+    for entry in batch:
+        job = jobs.get(entry["job_id"]) if entry["job_id"] else None
+        if job is not None:
+            items.append({"filename": entry["filename"], "track": entry["track"],
+                          **job.to_dict()})
+        elif entry["job_id"]:
+            items.append({**entry, "status": "failed", "error": "Job expired"})
+        else:
+            items.append(entry)
+    failed = sum(1 for item in items if item["status"] in ("failed", "cancelled"))
+    finished = sum(1 for item in items
+                   if item["status"] in ("done", "failed", "cancelled"))
+    if finished < len(items):
+        status = "running"
+    elif failed == len(items):
+        status = "failed"
+    else:
+        status = "partial" if failed else "done"
+    return {"status": status, "done": finished, "total": len(items),
+            "jobs": items}
+
+@app.get("/master/batch/{batch_id}")
+def master_batch_status(batch_id: str):
+    batch = batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Unknown batch")
+    return {"batch_id": batch_id, **_batch_status(batch)}
+
+@app.get("/master/{job_id}")
+def master_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
+@app.delete("/master/{job_id}")
+def master_cancel(job_id: str):
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
 
-if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+@app.get("/master/{job_id}/result")
+def master_result(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if job.status == "failed":
+        return JSONResponse(status_code=500,
+                            content={"error": f"Mastering failed: {job.error}"})
+    if job.status == "cancelled":
+        return JSONResponse(status_code=409,
+                            content={"error": "Mastering was cancelled"})
+    if not job.finished:
+        return JSONResponse(status_code=202, content=job.to_dict())
+    return job.result
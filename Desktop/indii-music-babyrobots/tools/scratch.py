@@ -0,0 +1,205 @@
+# tools/scratch.py
+"""Managed scratch space for in-flight mastering files.
+
+Uploads and intermediate renders live under one configurable directory
+(put it on fast local disk, ideally the same filesystem as the result
+cache so finished files are renamed into it rather than copied). Space is
+reserved against a byte quota *before* anything is written, so a burst of
+large stems is turned away up front instead of filling the disk halfway
+through a release.
+
+Each server process works in its own `proc-<id>/` directory holding a
+lock file for as long as it runs; at startup, directories whose lock is
+no longer held (their process crashed) are swept. Every reservation is a
+subdirectory that is removed with everything in it on release; callers
+report what they have written into it (`Reservation.wrote`) so the
+free-disk check never has to walk the directory.
+"""
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PROCESS_PREFIX = "proc-"
+_CLAIM_PREFIX = "claim-"
+_LOCK_NAME = ".lock"
+# A claim dir is renamed within moments; older ones are from a crash
+_CLAIM_GRACE_SECONDS = 60
+
+
+class ScratchFullError(Exception):
+    """Raised when a reservation would exceed the quota or free disk space."""
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+class Reservation:
+    """`nbytes` of scratch quota plus a private directory to spend it in."""
+
+    def __init__(self, space: "ScratchSpace", nbytes: int):
+        self.space = space
+        self.nbytes = nbytes
+        self.dir = os.path.join(space.process_dir, uuid.uuid4().hex)
+        os.makedirs(self.dir)
+        self.written = 0
+        self._released = False
+
+    def path(self, name: str) -> str:
+        """Path for file `name` inside this reservation."""
+        return os.path.join(self.dir, name)
+
+    def wrote(self, nbytes: int):
+        """Record `nbytes` written here (disk space no longer outstanding)."""
+        nbytes = max(0, min(nbytes, self.nbytes - self.written))
+        self.written += nbytes
+        self.space._wrote(nbytes)
+
+    def release(self):
+        """Delete everything written here and return the quota (idempotent)."""
+        if self._released:
+            return
+        self._released = True
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.space._release(self.nbytes, self.written)
+
+    def __enter__(self) -> "Reservation":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class ScratchSpace:
+    """Quota-bounded scratch directory shared by one server process."""
+
+    def __init__(self, root: str = "./mastering_scratch",
+                 quota_bytes: int = 4 * 1024 ** 3,
+                 min_free_bytes: int = 512 * 1024 ** 2):
+        self.root = os.path.abspath(root)
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.process_dir: Optional[str] = None
+        self.reserved = 0
+        self.written = 0  # reported by reservations; the rest may still land
+        self.active = 0
+        self.rejected = 0
+        self.swept_bytes = 0
+        self._lock = threading.Lock()
+        self._lock_file = None
+
+    def open(self) -> Tuple[int, int]:
+        """Sweep crashed processes' leftovers, then claim our own directory.
+
+        Returns (directories, bytes) swept.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        swept = self.sweep()
+        # Lock first, then rename into the swept namespace, so a sibling
+        # starting at the same moment never sees our directory unlocked
+        name = uuid.uuid4().hex
+        claiming = os.path.join(self.root, _CLAIM_PREFIX + name)
+        os.makedirs(claiming)
+        self._lock_file = open(os.path.join(claiming, _LOCK_NAME), "w")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.process_dir = os.path.join(self.root, _PROCESS_PREFIX + name)
+        os.rename(claiming, self.process_dir)
+        return swept
+
+    def close(self):
+        """Remove this process's directory (and any files still in it)."""
+        if self.process_dir is None:
+            return
+        shutil.rmtree(self.process_dir, ignore_errors=True)
+        self._lock_file.close()
+        self.process_dir = None
+        self._lock_file = None
+
+    def sweep(self) -> Tuple[int, int]:
+        """Delete process directories whose owner is gone."""
+        dirs = size = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if path == self.process_dir or not os.path.isdir(path):
+                continue
+            if name.startswith(_CLAIM_PREFIX):
+                if time.time() - os.path.getmtime(path) < _CLAIM_GRACE_SECONDS:
+                    continue
+            elif not name.startswith(_PROCESS_PREFIX):
+                continue
+            try:
+                with open(os.path.join(path, _LOCK_NAME), "a") as lock:
+                    # A live owner holds this lock; skip its directory
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    orphan = dir_size(path)
+                    shutil.rmtree(path, ignore_errors=True)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                logger.warning("Could not sweep scratch dir %s: %s", path, e)
+                continue
+            dirs += 1
+            size += orphan
+        if dirs:
+            logger.info("Swept %d orphaned scratch dirs (%d bytes)", dirs, size)
+        self.swept_bytes += size
+        return dirs, size
+
+    def reserve(self, nbytes: int) -> Reservation:
+        """Reserve `nbytes`, or raise ScratchFullError without waiting."""
+        if self.process_dir is None:
+            raise RuntimeError("Scratch space is not open")
+        with self._lock:
+            if self.reserved + nbytes > self.quota_bytes:
+                self.rejected += 1
+                raise ScratchFullError(
+                    f"Scratch quota exhausted ({self.reserved} of "
+                    f"{self.quota_bytes} bytes reserved, {nbytes} requested)")
+            # The quota may be larger than what the disk actually has left;
+            # reserved bytes not reported written are still to come
+            free = shutil.disk_usage(self.root).free
+            unwritten = self.reserved - self.written
+            if free - max(0, unwritten) - nbytes < self.min_free_bytes:
+                self.rejected += 1
+                raise ScratchFullError(f"Scratch disk is nearly full "
+                                       f"({free} bytes free)")
+            self.reserved += nbytes
+            self.active += 1
+        try:
+            return Reservation(self, nbytes)
+        except OSError:
+            self._release(nbytes, 0)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {"root": self.root, "quota_bytes": self.quota_bytes,
+                "reserved_bytes": self.reserved, "written_bytes": self.written,
+                "reservations": self.active,
+                "used_bytes": dir_size(self.process_dir) if self.process_dir else 0,
+                "free_disk_bytes": shutil.disk_usage(self.root).free,
+                "rejected": self.rejected, "swept_bytes": self.swept_bytes}
+
+    def _wrote(self, nbytes: int):
+        with self._lock:
+            self.written += nbytes
+
+    def _release(self, nbytes: int, written: int):
+        with self._lock:
+            self.reserved -= nbytes
+            self.written -= written
+            self.active -= 1
@@ -0,0 +1,320 @@
+"""Request tracing and latency histograms shared by every service.
+
+A trace id travels in the X-Trace-Id header from main.py through
+LabelHead and the tool gateway into each MCP server. Within a process the
+current trace lives in a context variable, so `span("name")` blocks
+anywhere on the request path record their timing. Sampling is decided at
+the edge (TRACE_SAMPLE_RATE, default off) and inherited downstream; an
+unsampled request costs one context-variable lookup per span.
+
+Clients cannot opt themselves into sampling: the public edge ignores
+incoming trace headers, and internal services only continue them from
+trusted hops. With TRACE_SECRET set, a hop is trusted only when its
+X-Trace-Signature (an HMAC of the trace id) verifies, so a forged trace
+id falls back to the sample rate everywhere.
+
+Request latency histograms are always kept and exposed in Prometheus text
+format on /metrics; sampled traces are kept in a small ring buffer and
+served from /traces/{trace_id}.
+"""
+import bisect
+import contextvars
+import hashlib
+import hmac
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+TRACE_HEADER = "x-trace-id"
+PARENT_HEADER = "x-parent-span-id"
+SIGNATURE_HEADER = "x-trace-signature"
+SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+TRACE_SECRET = os.environ.get("TRACE_SECRET", "")
+MAX_TRACES = 1000
+MAX_SPANS = 500  # per trace and service; long job polls stop adding
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    duration: Optional[float] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "span_id": self.span_id,
+                "parent_id": self.parent_id, "start": self.start,
+                "duration_ms": None if self.duration is None
+                else round(self.duration * 1000, 3),
+                **({"attrs": self.attrs} if self.attrs else {})}
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    service: str
+    spans: List[Span] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace_id": self.trace_id, "service": self.service,
+                "spans": [s.to_dict() for s in list(self.spans)]}
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_parent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("span", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Metrics:
+    """Named, labelled histograms plus the Prometheus text rendering."""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, help: str = "", **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+                self._help.setdefault(name, help)
+            hist.observe(seconds)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self._histograms})
+            for name in names:
+                lines.append(f"# HELP {name} {self._help.get(name) or name}")
+                lines.append(f"# TYPE {name} histogram")
+                for (hname, labels), hist in sorted(self._histograms.items()):
+                    if hname != name:
+                        continue
+                    base = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                    sep = "," if base else ""
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f'{name}_bucket{{{base}{sep}le="{le}"}} {cumulative}')
+                    braces = f"{{{base}}}" if base else ""
+                    lines.append(f"{name}_sum{braces} {hist.sum}")
+                    lines.append(f"{name}_count{braces} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
+_traces: "OrderedDict[str, Trace]" = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+def _new_id(bits: int = 64) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.trace_id if trace else None
+
+
+def start_trace(service: str, trace_id: Optional[str] = None,
+                parent_id: Optional[str] = None) -> Optional[Trace]:
+    """Begin (or continue) a trace in the current context.
+
+    A `trace_id` must come from a trusted hop (see `trusted_trace_id`); it
+    was sampled upstream and is continued. Otherwise a new trace is
+    started with probability SAMPLE_RATE.
+    """
+    if trace_id is None:
+        if not SAMPLE_RATE or random.random() >= SAMPLE_RATE:
+            _trace.set(None)
+            return None
+        trace_id = uuid.uuid4().hex
+    key = trace_id + ":" + service
+    with _traces_lock:
+        # Several calls of one trace (e.g. job polls) share a record
+        trace = _traces.get(key)
+        if trace is None:
+            trace = _traces[key] = Trace(trace_id, service)
+            while len(_traces) > MAX_TRACES:
+                _traces.popitem(last=False)
+    _trace.set(trace)
+    _parent.set(parent_id)
+    return trace
+
+
+def _signature(trace_id: str) -> str:
+    return hmac.new(TRACE_SECRET.encode(), trace_id.encode(),
+                    hashlib.sha256).hexdigest()[:32]
+
+
+def trusted_trace_id(headers: Dict[bytes, bytes], trust_incoming: bool) -> Optional[str]:
+    """The incoming trace id, if the hop that sent it may be trusted."""
+    trace_id = headers.get(TRACE_HEADER.encode())
+    if not trace_id:
+        return None
+    trace_id = trace_id.decode("latin-1")
+    if TRACE_SECRET:
+        signature = headers.get(SIGNATURE_HEADER.encode(), b"").decode("latin-1")
+        return trace_id if hmac.compare_digest(signature, _signature(trace_id)) else None
+    return trace_id if trust_incoming else None
+
+
+def get_trace(trace_id: str) -> List[Dict[str, Any]]:
+    """Every span this process recorded for `trace_id`."""
+    with _traces_lock:
+        return [t.to_dict() for key, t in _traces.items()
+                if key.startswith(trace_id + ":")]
+
+
+class _NullSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attrs):
+    """Time a block as a child of the current span (no-op when unsampled)."""
+    trace = _trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _record(trace, name, attrs)
+
+
+@contextmanager
+def _record(trace: Trace, name: str, attrs: Dict[str, Any]) -> Iterator[Span]:
+    s = Span(name, _new_id(), _parent.get(), time.time(), attrs=attrs)
+    if len(trace.spans) < MAX_SPANS:
+        trace.spans.append(s)
+    token = _parent.set(s.span_id)
+    started = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        s.duration = time.perf_counter() - started
+        _parent.reset(token)
+        metrics.observe("span_duration_seconds", s.duration,
+                        "Duration of traced spans", service=trace.service, span=name)
+
+
+def outgoing_headers() -> Dict[str, str]:
+    """Headers that carry the current trace to another service."""
+    trace = _trace.get()
+    if trace is None:
+        return {}
+    headers = {TRACE_HEADER: trace.trace_id}
+    if TRACE_SECRET:
+        headers[SIGNATURE_HEADER] = _signature(trace.trace_id)
+    parent = _parent.get()
+    if parent:
+        headers[PARENT_HEADER] = parent
+    return headers
+
+
+class TracingMiddleware:
+    """ASGI middleware: continues/starts traces and times every request.
+
+    Pure ASGI (not BaseHTTPMiddleware) so streaming responses pass
+    through untouched; the latency recorded for them runs until the last
+    body chunk is sent. `trust_incoming` is False for public-facing
+    services, whose callers must not decide what gets sampled.
+    """
+
+    def __init__(self, app, service: str, trust_incoming: bool = True):
+        self.app = app
+        self.service = service
+        self.trust_incoming = trust_incoming
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        trace_id = trusted_trace_id(headers, self.trust_incoming)
+        parent = headers.get(PARENT_HEADER.encode()) if trace_id else None
+        trace = start_trace(self.service, trace_id,
+                            parent.decode("latin-1") if parent else None)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if trace is not None:
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (TRACE_HEADER.encode(), trace.trace_id.encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            # Fixed span name: raw paths carry ids and would explode the labels
+            with span("http.request", method=scope["method"], path=scope["path"]):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            metrics.observe("http_request_duration_seconds",
+                            time.perf_counter() - started,
+                            "HTTP request latency", service=self.service,
+                            method=scope["method"],
+                            route=getattr(route, "path", "unmatched"),
+                            status=status["code"])
+
+
+def install(app, service: str, trust_incoming: bool = True):
+    """Add the tracing middleware plus /metrics and /traces routes to `app`.
+
+    Pass `trust_incoming=False` for services that face external clients.
+    """
+    from fastapi.responses import JSONResponse, PlainTextResponse
+
+    app.add_middleware(TracingMiddleware, service=service,
+                       trust_incoming=trust_incoming)
+
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        return PlainTextResponse(metrics.render(),
+                                 media_type="text/plain; version=0.0.4")
+
+    @app.get("/traces/{trace_id}", include_in_schema=False)
+    def trace_detail(trace_id: str):
+        found = get_trace(trace_id)
+        if not found:
+            return JSONResponse(status_code=404, content={"error": "Unknown trace"})
+        return {"trace_id": trace_id, "services": found}